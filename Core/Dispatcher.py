@@ -1,148 +1,351 @@
-# dispatcher.py
-import json, sys, subprocess
-from pathlib import Path
-
-ROOT = Path(__file__).resolve().parent
-ORDERS_JSON = ROOT / "Orders.json"
-
-
-def _parse_relaxed_json(stdout: str, stderr: str):
-    """
-    Intenta:
-      1) json.loads(stdout) directo
-      2) parsear la ÚLTIMA línea que parezca JSON
-      3) buscar el último bloque que empiece por '{' y terminar en el último '}'
-    Si todo falla, devuelve mensaje de error con stdout/stderr.
-    """
-    # 1) directo
-    try:
-        return json.loads(stdout) if stdout else {}
-    except Exception:
-        pass
-
-    # 2) última línea que parezca JSON
-    for line in reversed([ln.strip() for ln in stdout.splitlines() if ln.strip()]):
-        if line.startswith("{") and line.endswith("}"):
-            try:
-                return json.loads(line)
-            except Exception:
-                continue
-
-    # 3) último bloque {...}
-    start = stdout.rfind("{")
-    end = stdout.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        candidate = stdout[start:end+1].strip()
-        try:
-            return json.loads(candidate)
-        except Exception:
-            pass
-
-    # falló todo
-    return {"ok": False, "error": "stdout no es JSON", "stdout": stdout, "stderr": stderr}
-
-def load_orders():
-    try:
-        with open(ORDERS_JSON, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        return {"ok": False, "error": f"No se pudo leer Orders.json: {e}", "path": str(ORDERS_JSON)}
-
-
-def build_cmd(script: str, spec: dict, args_map: dict):
-    """
-    Sustituye placeholders en spec['args'] con args_map y construye el comando.
-    Soporta:
-      - <obligatorio>  -> debe existir en args_map
-      - [opcional]     -> si existe en args_map, se añade
-      - literales      -> se añaden tal cual (p.ej., "busca")
-    """
-    arg_tpl = spec.get("args", [])
-
-
-    script_path = Path(script).resolve()
-    if not script_path.exists():
-        return None, f"Script no encontrado: {script_path}"
-
-    cmd = [sys.executable, str(script_path)]
-    for token in arg_tpl:
-        if token.startswith("<") and token.endswith(">"):
-            key = token[1:-1]
-            if key not in args_map or args_map[key] in (None, ""):
-                return None, f"Falta argumento obligatorio: {key}"
-            cmd.append(str(args_map[key]))
-        elif token.startswith("[") and token.endswith("]"):
-            key = token[1:-1]
-            val = args_map.get(key)
-            if val not in (None, ""):
-                cmd.append(str(val))
-        else:
-            # literal
-            cmd.append(token)
-    return cmd, None
-
-def run_command(cmd: list, timeout=60):
-    def _decode(b: bytes) -> str:
-        if b is None:
-            return ""
-        try:
-            return b.decode("utf-8")
-        except UnicodeDecodeError:
-            try:
-                return b.decode("utf-8-sig", errors="strict")
-            except Exception:
-                return b.decode("mbcs", errors="replace")
-    try:
-        proc = subprocess.run(
-            cmd,
-            cwd=str(ROOT),
-            capture_output=True,
-            text=False,
-            timeout=timeout
-        )
-        stdout = _decode(proc.stdout).strip()
-        stderr = _decode(proc.stderr).strip()
-
-        data = _parse_relaxed_json(stdout, stderr)
-
-        data.setdefault("_meta", {})
-        data["_meta"]["cmd"] = cmd
-        data["_meta"]["returncode"] = proc.returncode
-
-        if proc.returncode != 0 and not data.get("ok", False):
-            if "error" not in data:
-                data["error"] = f"Proceso terminó con código {proc.returncode}"
-                data["stderr"] = stderr
-            data["ok"] = False
-        return data
-    except subprocess.TimeoutExpired:
-        return {"ok": False, "error": "timeout ejecutando el comando", "_meta": {"cmd": cmd}}
-    except Exception as e:
-        return {"ok": False, "error": str(e), "_meta": {"cmd": cmd}}
-
-def dispatch(domain: str, command: str, **kwargs):
-    orders = load_orders()
-    if isinstance(orders, dict) and orders.get("ok") is False:
-        return orders  # error al cargar Orders.json
-
-    if domain not in orders:
-        return {"ok": False, "error": f"Dominio desconocido: {domain}"}
-
-    cmds = orders[domain].get("commands", {})
-    if command not in cmds:
-        return {"ok": False, "error": f"Comando desconocido para '{domain}': {command}"}
-    spec = cmds[command]
-    script = orders[domain].get("script")
-    if not script:
-        return None, "Spec inválida (falta 'script' o 'args')."
-
-    cmd, err = build_cmd(script, spec, kwargs)
-
-    if err:
-        return {"ok": False, "error": err}
-
-    result = run_command(cmd)
-    # añade info de resolución para depurar
-    result.setdefault("_meta", {})
-    result["_meta"]["orders_path"] = str(ORDERS_JSON)
-    return result
\ No newline at end of file
+# dispatcher.py
+import json, sys, os, atexit, asyncio, threading
+from pathlib import Path
+from Core.Registry import REGISTRY, ORDERS_JSON
+from Core.Worker import WorkerPool, load_script, parse_event
+
+ROOT = Path(__file__).resolve().parent
+
+# Modo de ejecución por dominio ("mode" en Orders.json):
+#   - "subprocess" (por defecto): un proceso nuevo por orden
+#   - "worker":    proceso residente por dominio (ALFRED_WORKERS=0 lo desactiva)
+#   - "inprocess": importa el script como plugin y llama a su "entry"
+#                  (ALFRED_INPROCESS=0 lo desactiva)
+WORKERS_ENABLED = os.environ.get("ALFRED_WORKERS", "1") != "0"
+INPROCESS_ENABLED = os.environ.get("ALFRED_INPROCESS", "1") != "0"
+_WORKERS = WorkerPool()
+atexit.register(_WORKERS.close_all)
+
+DEFAULT_TIMEOUT = 60  # segundos por orden si no se indica deadline
+STREAM_LIMIT = 1 << 24  # tamaño máximo de una línea de stdout al leer en streaming
+
+_PLUGINS: dict = {}
+_PLUGINS_LOCK = threading.Lock()
+
+
+def _parse_relaxed_json(stdout: str, stderr: str):
+    """
+    Intenta:
+      1) json.loads(stdout) directo
+      2) parsear la ÚLTIMA línea que parezca JSON
+      3) buscar el último bloque que empiece por '{' y terminar en el último '}'
+    Si todo falla, devuelve mensaje de error con stdout/stderr.
+    """
+    # 1) directo
+    try:
+        return json.loads(stdout) if stdout else {}
+    except Exception:
+        pass
+
+    # 2) última línea que parezca JSON
+    for line in reversed([ln.strip() for ln in stdout.splitlines() if ln.strip()]):
+        if line.startswith("{") and line.endswith("}"):
+            try:
+                return json.loads(line)
+            except Exception:
+                continue
+
+    # 3) último bloque {...}
+    start = stdout.rfind("{")
+    end = stdout.rfind("}")
+    if start != -1 and end != -1 and end > start:
+        candidate = stdout[start:end+1].strip()
+        try:
+            return json.loads(candidate)
+        except Exception:
+            pass
+
+    # falló todo
+    return {"ok": False, "error": "stdout no es JSON", "stdout": stdout, "stderr": stderr}
+
+def load_orders():
+    try:
+        return REGISTRY.load()
+    except Exception as e:
+        return {"ok": False, "error": f"No se pudo leer Orders.json: {e}", "path": str(ORDERS_JSON)}
+
+
+def build_cmd(script: str, signature: list, args_map: dict):
+    """
+    Sustituye los placeholders de la firma parseada (ver Registry) con args_map
+    y construye el comando. Soporta:
+      - <obligatorio>  -> debe existir en args_map
+      - [opcional]     -> si existe en args_map, se añade
+      - literales      -> se añaden tal cual (p.ej., "busca")
+    """
+    script_path = Path(script).resolve()
+    if not script_path.exists():
+        return None, f"Script no encontrado: {script_path}"
+
+    cmd = [sys.executable, str(script_path)]
+    for key, required in signature:
+        if required is True:
+            if key not in args_map or args_map[key] in (None, ""):
+                return None, f"Falta argumento obligatorio: {key}"
+            cmd.append(str(args_map[key]))
+        elif required is False:
+            val = args_map.get(key)
+            if val not in (None, ""):
+                cmd.append(str(val))
+        else:
+            # literal
+            cmd.append(key)
+    return cmd, None
+
+def _decode(b: bytes) -> str:
+    if b is None:
+        return ""
+    try:
+        return b.decode("utf-8")
+    except UnicodeDecodeError:
+        try:
+            return b.decode("utf-8-sig", errors="strict")
+        except Exception:
+            return b.decode("mbcs", errors="replace")
+
+def _parse_output(stdout: str, stderr: str) -> dict:
+    """
+    Quita las líneas de evento del protocolo (ver Core/Worker.parse_event).
+    Si hubo un evento "result" es el resultado; si no, parseo relajado del resto.
+    """
+    if '"event"' not in stdout:
+        return _parse_relaxed_json(stdout, stderr)
+    rest, final = [], None
+    for line in stdout.splitlines():
+        evt = parse_event(line)
+        if evt is None:
+            rest.append(line)
+        elif evt["event"] == "result" and isinstance(evt.get("result"), dict):
+            final = evt["result"]
+    if final is not None:
+        return final
+    return _parse_relaxed_json("\n".join(rest).strip(), stderr)
+
+def _build_result(cmd: list, stdout: str, stderr: str, returncode: int) -> dict:
+    data = _parse_output(stdout, stderr)
+
+    data.setdefault("_meta", {})
+    data["_meta"]["cmd"] = cmd
+    data["_meta"]["returncode"] = returncode
+
+    if returncode != 0 and not data.get("ok", False):
+        if "error" not in data:
+            data["error"] = f"Proceso terminó con código {returncode}"
+            data["stderr"] = stderr
+        data["ok"] = False
+    return data
+
+async def run_command_async(cmd: list, timeout=DEFAULT_TIMEOUT, on_event=None):
+    """
+    Ejecuta `cmd` con asyncio.create_subprocess_exec, leyendo stdout línea a línea:
+    los eventos de progreso se pasan a on_event mientras el proceso corre.
+    Al vencer el deadline o al cancelarse la tarea, mata el proceso.
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=str(ROOT),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=STREAM_LIMIT,
+        )
+    except Exception as e:
+        return {"ok": False, "error": str(e), "_meta": {"cmd": cmd}}
+
+    async def _read_stdout() -> str:
+        lines = []
+        async for raw in proc.stdout:
+            line = _decode(raw)
+            evt = parse_event(line) if on_event else None
+            if evt is not None and evt["event"] != "result":
+                on_event(evt)
+            else:
+                lines.append(line)
+        return "".join(lines)
+
+    async def _communicate():
+        out, err = await asyncio.gather(_read_stdout(), proc.stderr.read())
+        await proc.wait()
+        return out, _decode(err)
+
+    try:
+        out, err = await asyncio.wait_for(_communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        if proc.returncode is None:
+            proc.kill()
+            await asyncio.shield(proc.wait())
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        return {"ok": False, "error": "timeout ejecutando el comando", "_meta": {"cmd": cmd}}
+    except Exception as e:
+        return {"ok": False, "error": str(e), "_meta": {"cmd": cmd}}
+    return _build_result(cmd, out.strip(), err.strip(), proc.returncode)
+
+def run_command(cmd: list, timeout=DEFAULT_TIMEOUT, on_event=None):
+    """Versión síncrona de run_command_async."""
+    return asyncio.run(run_command_async(cmd, timeout, on_event))
+
+def run_in_worker(cmd: list, timeout=DEFAULT_TIMEOUT, on_event=None):
+    """
+    Ejecuta `cmd` (tal como lo arma build_cmd) en el worker residente del script.
+    Devuelve None si el worker no pudo arrancar -> el caller usa run_command.
+    """
+    script, argv = cmd[1], cmd[2:]
+    worker = _WORKERS.get(script, str(ROOT))
+    try:
+        raw = worker.run(argv, timeout=timeout, on_event=on_event)
+    except RuntimeError:
+        return None
+    except TimeoutError:
+        return {"ok": False, "error": "timeout ejecutando el comando", "_meta": {"cmd": cmd, "mode": "worker"}}
+    except Exception as e:
+        return {"ok": False, "error": str(e), "_meta": {"cmd": cmd, "mode": "worker"}}
+    data = _build_result(cmd, (raw.get("stdout") or "").strip(), (raw.get("stderr") or "").strip(), raw.get("returncode", 1))
+    data["_meta"]["mode"] = "worker"
+    return data
+
+def _load_plugin(script_path: str):
+    with _PLUGINS_LOCK:
+        mod = _PLUGINS.get(script_path)
+        if mod is None:
+            mod = _PLUGINS[script_path] = load_script(script_path)
+        return mod
+
+def run_inprocess(script_path: str, entry: str, signature: list, args_map: dict, on_event=None, options=None):
+    """
+    Llama a `entry` del script importado como plugin, con los parámetros de la
+    firma en orden posicional (opcionales ausentes -> None / se omiten al final).
+    Si el script expone _EVENT_SINK (threading.local), sus eventos llegan a on_event.
+    Devuelve None si el plugin no se puede importar -> el caller usa subproceso.
+    """
+    meta = {"mode": "inprocess", "entry": entry, "script": script_path}
+    try:
+        mod = _load_plugin(script_path)
+        func = getattr(mod, entry)
+    except Exception:
+        return None
+    sink = getattr(mod, "_EVENT_SINK", None)
+
+    params = [args_map.get(name) for name, kind in signature if kind is not None]
+    params = [None if v in (None, "") else str(v) for v in params]
+    while params and params[-1] is None:
+        params.pop()
+    if sink is not None:
+        sink.fn = on_event
+    try:
+        data = func(*params, **(options or {}))
+    except SystemExit as e:
+        data = {"ok": False, "error": f"{entry} llamó a sys.exit({e.code})"}
+    except Exception as e:
+        data = {"ok": False, "error": str(e)}
+    finally:
+        if sink is not None:
+            sink.fn = None
+    if not isinstance(data, dict):
+        data = {"ok": False, "error": f"{entry} no devolvió un objeto JSON", "value": repr(data)}
+    data.setdefault("_meta", {}).update(meta)
+    return data
+
+def _resolve(domain: str, command: str, kwargs: dict):
+    """
+    Resuelve una orden contra Orders.json.
+    Devuelve (plan, None) con plan = {cmd, mode, entry, signature} o (None, error_dict).
+    """
+    orders = load_orders()
+    if isinstance(orders, dict) and orders.get("ok") is False:
+        return None, orders  # error al cargar Orders.json
+
+    if domain not in orders:
+        return None, {"ok": False, "error": f"Dominio desconocido: {domain}"}
+
+    signature = REGISTRY.signature(domain, command)
+    if signature is None:
+        return None, {"ok": False, "error": f"Comando desconocido para '{domain}': {command}"}
+    script = orders[domain].get("script")
+    if not script:
+        return None, {"ok": False, "error": "Spec inválida (falta 'script' o 'args')."}
+
+    cmd, err = build_cmd(script, signature, kwargs)
+
+    if err:
+        return None, {"ok": False, "error": err}
+
+    # "options" del comando: flags --clave=valor al final del argv
+    # (las entradas en proceso las reciben como argumentos con nombre);
+    # un argumento de la orden con el mismo nombre sustituye el valor por defecto
+    cmd_spec = orders[domain]["commands"][command]
+    options = {k: v if kwargs.get(k) in (None, "") else kwargs[k]
+               for k, v in (cmd_spec.get("options") or {}).items()}
+    cmd += [f"--{k}={v}" for k, v in options.items()]
+
+    return {
+        "cmd": cmd,
+        "mode": orders[domain].get("mode", "subprocess"),
+        "entry": cmd_spec.get("entry"),
+        "signature": signature,
+        "options": options,
+    }, None
+
+async def dispatch_async(domain: str, command: str, timeout: float | None = None, on_event=None, **kwargs):
+    """
+    Versión asíncrona de dispatch: `timeout` es el deadline de la orden (s).
+    Cancelar la tarea mata el subproceso. Los modos worker/inprocess corren en
+    un hilo (to_thread); al vencer el deadline se devuelve timeout aunque el
+    hilo termine por su cuenta.
+    on_event(evento) recibe los eventos de progreso/parciales del script
+    (puede llamarse desde otro hilo).
+    """
+    timeout = DEFAULT_TIMEOUT if timeout is None else float(timeout)
+    plan, error = _resolve(domain, command, kwargs)
+    if error:
+        return error
+    cmd = plan["cmd"]
+
+    result = None
+    try:
+        if plan["mode"] == "inprocess" and INPROCESS_ENABLED and plan["entry"]:
+            result = await asyncio.wait_for(
+                asyncio.to_thread(run_inprocess, cmd[1], plan["entry"], plan["signature"], kwargs, on_event,
+                                  plan["options"]), timeout)
+        elif plan["mode"] == "worker" and WORKERS_ENABLED:
+            result = await asyncio.to_thread(run_in_worker, cmd, timeout, on_event)
+    except asyncio.TimeoutError:
+        result = {"ok": False, "error": "timeout ejecutando el comando", "_meta": {"cmd": cmd, "mode": plan["mode"]}}
+    if result is None:
+        result = await run_command_async(cmd, timeout, on_event)
+    # añade info de resolución para depurar
+    result.setdefault("_meta", {})
+    result["_meta"]["orders_path"] = str(ORDERS_JSON)
+    return result
+
+async def dispatch_events(domain: str, command: str, timeout: float | None = None, **kwargs):
+    """
+    Iterador asíncrono sobre una orden: produce sus eventos según llegan y por
+    último {"event": "result", "result": {...}}.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def _on_event(evt: dict):
+        loop.call_soon_threadsafe(queue.put_nowait, evt)
+
+    task = asyncio.create_task(dispatch_async(domain, command, timeout=timeout, on_event=_on_event, **kwargs))
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+                continue
+            getter.cancel()
+            while not queue.empty():
+                yield queue.get_nowait()
+            yield {"event": "result", "result": task.result()}
+            return
+    finally:
+        if not task.done():
+            task.cancel()
+
+def dispatch(domain: str, command: str, on_event=None, **kwargs):
+    """Envoltorio síncrono de dispatch_async (no usar dentro de un event loop)."""
+    return asyncio.run(dispatch_async(domain, command, on_event=on_event, **kwargs))
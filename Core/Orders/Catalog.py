@@ -0,0 +1,365 @@
+"""
+Catálogo residente de nombres de archivo para Files.py.
+
+Se siembra con un recorrido de las raíces configuradas y luego se mantiene al
+día en segundo plano:
+  - Linux: inotify (vía ctypes) con altas, bajas y renombrados al momento.
+  - Resto (o si inotify no está disponible / se agota el límite de watches):
+    sondeo del mtime de cada carpeta cada POLL_S segundos.
+Los eventos pasan por una cola acotada (QUEUE_MAX). Si se llena, se anota la
+carpeta del evento perdido y se re-escanea solo ese subárbol; un desbordamiento
+de la cola del kernel (IN_Q_OVERFLOW) re-escanea las raíces.
+
+Solo tiene sentido en un proceso residente (modo inprocess/worker del Dispatcher).
+"""
+import os, sys, time, queue, select, struct, threading
+from Fuzzy import TrigramIndex, rank_paths
+
+QUEUE_MAX = int(os.environ.get("ALFRED_CATALOG_QUEUE", "10000"))
+POLL_S = float(os.environ.get("ALFRED_CATALOG_POLL_S", "2.0"))
+
+# ---------- inotify (linux/inotify.h) ----------
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _dbg(*args):
+    print("[catalog]", *args, file=sys.stderr)
+
+
+class _Poller:
+    """Vigila carpetas comparando su mtime periódicamente."""
+
+    def __init__(self, catalog, interval: float = POLL_S):
+        self.catalog = catalog
+        self.interval = interval
+        self.mtimes: dict[str, int | None] = {}
+        self.lock = threading.Lock()
+
+    def watch(self, path: str):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        with self.lock:
+            self.mtimes[path] = mtime
+
+    def unwatch(self, path: str):
+        with self.lock:
+            self.mtimes.pop(path, None)
+
+    def run(self, stop: threading.Event):
+        while not stop.wait(self.interval):
+            with self.lock:
+                items = list(self.mtimes.items())
+            for path, mtime in items:
+                try:
+                    current = os.stat(path).st_mtime_ns
+                except OSError:
+                    current = None
+                if current != mtime:
+                    with self.lock:
+                        if path in self.mtimes:
+                            self.mtimes[path] = current
+                    self.catalog.push(("dir", path), path)
+
+
+class _Inotify:
+    """inotify por ctypes; las carpetas que no se pueden vigilar pasan a un _Poller."""
+
+    MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR
+
+    def __init__(self, catalog):
+        import ctypes, ctypes.util
+        self.catalog = catalog
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.wd_path: dict[int, str] = {}
+        self.path_wd: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.fallback = _Poller(catalog)
+        self._warned = False
+
+    def watch(self, path: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:  # normalmente ENOSPC (max_user_watches)
+            if not self._warned:
+                _dbg("sin watches de inotify disponibles; se sondean las carpetas restantes")
+                self._warned = True
+            self.fallback.watch(path)
+            return
+        with self.lock:
+            self.wd_path[wd] = path
+            self.path_wd[path] = wd
+
+    def unwatch(self, path: str):
+        with self.lock:
+            wd = self.path_wd.pop(path, None)
+            if wd is not None:
+                self.wd_path.pop(wd, None)
+        if wd is not None:
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.fallback.unwatch(path)
+
+    def run(self, stop: threading.Event):
+        threading.Thread(target=self.fallback.run, args=(stop,), daemon=True).start()
+        while not stop.is_set():
+            ready, _, _ = select.select([self.fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                continue
+            off = 0
+            while off < len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, off)
+                name = data[off + _EVENT_HEADER.size: off + _EVENT_HEADER.size + length].split(b"\0", 1)[0]
+                off += _EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    for root in self.catalog.roots:
+                        self.catalog.push(("rescan", root), root)
+                    continue
+                with self.lock:
+                    folder = self.wd_path.get(wd)
+                if folder is None or not name:
+                    continue
+                is_dir = bool(mask & IN_ISDIR)
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.catalog.push(("create", folder, os.fsdecode(name), is_dir), folder)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.catalog.push(("delete", folder, os.fsdecode(name), is_dir), folder)
+
+
+def _make_watcher(catalog):
+    if sys.platform.startswith("linux"):
+        try:
+            return _Inotify(catalog)
+        except (OSError, AttributeError) as e:
+            _dbg(f"inotify no disponible ({e!r}); se usa sondeo")
+    return _Poller(catalog)
+
+
+class Catalog:
+    """
+    nombre_en_minúsculas -> {rutas} para todo lo que cuelga de `roots`,
+    respetando skip_re (regex sobre la ruta de las carpetas a omitir).
+    """
+
+    def __init__(self, roots: list, skip_re=None, queue_max: int = QUEUE_MAX):
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.skip_re = skip_re
+        self.names: dict[str, set] = {}
+        self.trigrams = TrigramIndex()       # sobre las claves de self.names
+        self.files: dict[str, set] = {}    # carpeta -> nombres de archivo
+        self.subdirs: dict[str, set] = {}  # carpeta -> subcarpetas
+        self.lock = threading.RLock()
+        self.events: queue.Queue = queue.Queue(maxsize=queue_max)
+        self.overflow: set = set()
+        self._overflow_lock = threading.Lock()
+        self.ready = threading.Event()
+        self._stop = threading.Event()
+        self.watcher = _make_watcher(self)
+
+    # ---------- ciclo de vida ----------
+    def start(self) -> "Catalog":
+        threading.Thread(target=self.watcher.run, args=(self._stop,), daemon=True, name="catalog-watch").start()
+        threading.Thread(target=self._apply_loop, daemon=True, name="catalog-apply").start()
+        threading.Thread(target=self._seed, daemon=True, name="catalog-seed").start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _seed(self):
+        t0 = time.monotonic()
+        for root in self.roots:
+            self._scan_subtree(root)
+        self.ready.set()
+        with self.lock:
+            n_files, n_dirs = sum(len(v) for v in self.files.values()), len(self.files)
+        _dbg(f"{n_files} archivos en {n_dirs} carpetas ({time.monotonic() - t0:.1f}s)")
+
+    # ---------- eventos ----------
+    def push(self, event: tuple, folder: str):
+        """Encola un evento; si la cola está llena se marca `folder` para re-escanear."""
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            with self._overflow_lock:
+                self.overflow.add(folder)
+
+    def _apply_loop(self):
+        while not self._stop.is_set():
+            try:
+                event = self.events.get(timeout=0.2)
+            except queue.Empty:
+                event = None
+            if event is not None:
+                try:
+                    self._apply(event)
+                except Exception as e:
+                    _dbg(f"evento {event!r} falló: {e!r}")
+            if self.overflow and (event is None or self.events.empty()):
+                with self._overflow_lock:
+                    dirty, self.overflow = sorted(self.overflow), set()
+                kept: list[str] = []
+                for path in dirty:  # sin subárboles anidados
+                    if not any(path == k or path.startswith(k.rstrip(os.sep) + os.sep) for k in kept):
+                        kept.append(path)
+                for path in kept:
+                    self._rescan_subtree(path)
+
+    def _apply(self, event: tuple):
+        op = event[0]
+        if op == "create":
+            _, folder, name, is_dir = event
+            path = os.path.join(folder, name)
+            if is_dir:
+                if self.skip_re is None or not self.skip_re.search(path):
+                    with self.lock:
+                        self.subdirs.setdefault(folder, set()).add(path)
+                    self._scan_subtree(path)
+            else:
+                with self.lock:
+                    self._add_file(folder, name)
+        elif op == "delete":
+            _, folder, name, is_dir = event
+            if is_dir:
+                self._remove_subtree(os.path.join(folder, name))
+            else:
+                with self.lock:
+                    self._remove_file(folder, name)
+        elif op == "dir":
+            self._relist(event[1])
+        elif op == "rescan":
+            self._rescan_subtree(event[1])
+
+    # ---------- mantenimiento (llamar con self.lock salvo los que lo toman) ----------
+    def _add_file(self, folder: str, name: str):
+        self.files.setdefault(folder, set()).add(name)
+        low = name.lower()
+        paths = self.names.get(low)
+        if paths is None:
+            paths = self.names[low] = set()
+            self.trigrams.add(low)
+        paths.add(os.path.join(folder, name))
+
+    def _remove_file(self, folder: str, name: str):
+        self.files.get(folder, set()).discard(name)
+        paths = self.names.get(name.lower())
+        if paths is not None:
+            paths.discard(os.path.join(folder, name))
+            if not paths:
+                del self.names[name.lower()]
+                self.trigrams.remove(name.lower())
+
+    def _list(self, path: str):
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return None
+        files, subdirs = set(), set()
+        for e in entries:
+            try:
+                is_dir = e.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.add(e.name)
+            elif not e.is_symlink() and not (self.skip_re and self.skip_re.search(e.path)):
+                subdirs.add(e.path)
+        return files, subdirs
+
+    def _set_listing(self, path: str, files: set, subdirs: set):
+        old = self.files.get(path, set())
+        for name in old - files:
+            self._remove_file(path, name)
+        for name in files - old:
+            self._add_file(path, name)
+        self.files.setdefault(path, set())
+        self.subdirs[path] = subdirs
+
+    def _scan_subtree(self, top: str):
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            self.watcher.watch(path)  # antes de listar: no se pierde nada entre medias
+            listing = self._list(path)
+            if listing is None:
+                self.watcher.unwatch(path)
+                continue
+            files, subdirs = listing
+            with self.lock:
+                self._set_listing(path, files, subdirs)
+            stack.extend(subdirs)
+
+    def _remove_subtree(self, top: str):
+        with self.lock:
+            self.subdirs.get(os.path.dirname(top), set()).discard(top)
+            stack = [top]
+            while stack:
+                path = stack.pop()
+                for name in self.files.pop(path, ()):
+                    self._remove_file(path, name)
+                stack.extend(self.subdirs.pop(path, ()))
+                self.watcher.unwatch(path)
+
+    def _relist(self, path: str):
+        """Una carpeta cambió (sondeo): aplica la diferencia de su listado."""
+        listing = self._list(path)
+        if listing is None:
+            self._remove_subtree(path)
+            return
+        files, subdirs = listing
+        with self.lock:
+            if path not in self.files:
+                return
+            old_subdirs = self.subdirs.get(path, set())
+            self._set_listing(path, files, subdirs)
+        for sub in subdirs - old_subdirs:
+            self._scan_subtree(sub)
+        for sub in old_subdirs - subdirs:
+            self._remove_subtree(sub)
+
+    def _rescan_subtree(self, path: str):
+        self._remove_subtree(path)
+        if os.path.isdir(path):
+            if path not in self.roots:
+                with self.lock:
+                    self.subdirs.setdefault(os.path.dirname(path), set()).add(path)
+            self._scan_subtree(path)
+
+    # ---------- consultas ----------
+    def covers(self, root: str) -> bool:
+        """True si `root` está dentro de alguna raíz del catálogo."""
+        root = os.path.normcase(os.path.abspath(root))
+        for r in self.roots:
+            r = os.path.normcase(r)
+            if root == r or root.startswith(r.rstrip(os.sep) + os.sep):
+                return True
+        return False
+
+    def lookup(self, name: str, under: str | None = None) -> list:
+        """Rutas conocidas de `name` (opcionalmente bajo `under`), las más cortas primero."""
+        with self.lock:
+            paths = list(self.names.get(name.lower(), ()))
+        if under:
+            prefix = os.path.normcase(os.path.abspath(under)).rstrip(os.sep) + os.sep
+            paths = [p for p in paths if os.path.normcase(p).startswith(prefix)]
+        return sorted(paths, key=len)
+
+    def similar(self, query: str, under: str | None = None, k: int = 10) -> list:
+        """Coincidencias parciales/aproximadas: [{"path", "name", "score"}]."""
+        with self.lock:
+            scored = self.trigrams.search(query, k * 4)
+        return rank_paths(scored, lambda n: self.lookup(n, under=under), k)
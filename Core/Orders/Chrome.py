@@ -1,234 +1,607 @@
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
-import sys, time, subprocess, socket, os, json, re
-from urllib.parse import urlparse
-
-
-DEBUG_PORT = 9222
-USER_DATA_DIR = os.path.expandvars(r"%LOCALAPPDATA%\ChromiumDebugProfile")
-BROWSER_BIN  = r"C:\Users\Josem\AppData\Local\ms-playwright\chromium-1181\chrome-win\chrome.exe"
-
-DETACHED_PROCESS = 0x00000008
-CREATE_NEW_PROCESS_GROUP = 0x00000200
-
-def _is_port_open(port:int)->bool:
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.settimeout(0.2)
-        return s.connect_ex(("127.0.0.1", port)) == 0
-
-def ensure_browser_with_cdp():
-    """Arranca (si hace falta) el navegador con CDP y devuelve JSON ok/error."""
-    if _is_port_open(DEBUG_PORT):
-        return {"ok": True, "message": "CDP ya estaba disponible"}
-    if not os.path.exists(BROWSER_BIN):
-        return {
-            "ok": False,
-            "error": f"No existe BROWSER_BIN: {BROWSER_BIN}. Edita la ruta a chromium/chrome."
-        }
-    args = [
-        BROWSER_BIN,
-        f"--remote-debugging-port={DEBUG_PORT}",
-        f"--user-data-dir={USER_DATA_DIR}",
-        "--no-first-run",
-        "--no-default-browser-check",
-    ]
-    subprocess.Popen(
-        args,
-        creationflags=DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP,
-        close_fds=True,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
-    for _ in range(100):  # ~10s
-        if _is_port_open(DEBUG_PORT):
-            return {"ok": True, "message": "CDP listo"}
-        time.sleep(0.1)
-    return {"ok": False, "error": "El navegador no abrió el puerto de depuración a tiempo."}
-
-def connect_playwright():
-    p = sync_playwright().start()
-    browser = p.chromium.connect_over_cdp(f"http://localhost:{DEBUG_PORT}")
-    ctx = browser.contexts[0] if browser.contexts else browser.new_context()
-    return p, browser, ctx
-
-def disconnect_only(p):
-    try:
-        p.stop()
-    except Exception:
-        pass
-
-def last_navigated_page(ctx):
-    # de más nueva a más vieja
-    for p in reversed([pg for pg in ctx.pages if not pg.is_closed()]):
-        u = (p.url or "").lower()
-        t = (p.title() or "").lower()
-        if u and u != "about:blank" and not u.startswith("chrome://") and "nueva pestaña" not in t:
-            return p
-    # si todas son blank/newtab, devuelve la última igualmente
-    return ctx.pages[-1]
-
-def search(ctx, keywords: str):
-    page = ctx.new_page()
-    ctx.current_page = page
-    page.goto("https://www.google.com", wait_until="domcontentloaded")
-    # Consentimiento (si aparece)
-    try:
-        page.locator("button:has-text('Acepto'), button:has-text('Accept all'), button:has-text('Acepto todo')").first.click(timeout=1500)
-    except Exception:
-        pass
-    box = page.locator('textarea[name="q"]')
-    box.fill(keywords)
-    page.keyboard.press("Enter")
-    try:
-        page.wait_for_selector("a h3", timeout=10000)
-    except PlaywrightTimeoutError:
-        return {"ok": False, "error": "No aparecieron resultados."}
-    count = page.locator("a h3:visible").count()
-    return {"ok": True, "message": f"Buscado: {keywords}", "results_visible": count}
-
-def open_url(ctx, url: str):
-    if not url.startswith("http"):  # añade https:// solo si falta
-        url = "https://" + url
-    page = ctx.new_page()
-    ctx.current_page = page
-    try:
-        page.goto(url, wait_until="domcontentloaded")
-    except PlaywrightError as e:
-        return {"ok": False, "error": f"No se pudo abrir la URL: {e}"}
-    return {"ok": True, "message": f"Abrí {url}", "url": page.url, "title": page.title()}
-
-def select(ctx, option: str):
-    if not getattr(ctx, "pages", None):
-        return {"ok": False, "error": "No hay pestañas abiertas."}
-
-    page = last_navigated_page(ctx)  # última pestaña creada (asumiendo que ctx.pages[0] es la activa)
-    page.bring_to_front()
-
-    # 1) Asegura que hay resultados con h3 (no solo visibles)
-    try:
-        page.wait_for_selector("a:has(h3)", timeout=10000)
-    except PlaywrightTimeoutError:
-        return {"ok": False, "error": "No hay resultados (a:has(h3))."}
-
-    # 2) Valida opción
-    try:
-        idx = int(option) - 1  # 1-based -> 0-based
-    except ValueError:
-        return {"ok": False, "error": "Opción inválida (no numérica)."}
-    if idx < 0:
-        return {"ok": False, "error": "El índice debe ser >= 1."}
-
-    # 3) Localiza TODOS los enlaces con h3 (sin :visible para permitir scroll)
-    links_all = page.locator("a:has(h3)")
-    count_all = links_all.count()
-    if count_all == 0:
-        return {"ok": False, "error": "No se encontraron enlaces con título (a>h3)."}
-
-    # 4) Si el índice no está disponible aún, intenta cargar más con scroll
-    if idx >= count_all:
-        seen = count_all
-        # Intenta varias veces (ajusta repeticiones/tiempos según tu UI)
-        for _ in range(6):
-            # Desplázate al final y da tiempo a que cargue nuevo contenido
-            page.keyboard.press("End")
-            page.wait_for_timeout(400)
-            new_count = links_all.count()
-            if new_count > seen:
-                seen = new_count
-                if idx < seen:
-                    break
-
-        count_all = links_all.count()
-        if idx >= count_all:
-            return {"ok": False, "error": f"Índice fuera de rango: {idx+1} (hay {count_all})."}
-
-    # 5) Obtén el enlace objetivo y llévalo a la vista
-    link = links_all.nth(idx)
-    try:
-        link.scroll_into_view_if_needed()
-        # Asegura que se vuelva visible antes del click
-        link.wait_for(state="visible", timeout=5000)
-    except PlaywrightTimeoutError:
-        # A veces es visible ya o hay overlays; seguimos con el click y fallback
-        pass
-
-    # 6) Click con manejo de navegación, popup o href
-    try:
-        with page.expect_navigation(wait_until="domcontentloaded", timeout=15000):
-            link.click()
-        return {"ok": True, "message": f"Abrí el resultado {idx+1}", "url": page.url, "title": page.title()}
-    except PlaywrightTimeoutError:
-        # Puede que se haya abierto una pestaña nueva (target=_blank)
-        try:
-            with page.expect_popup(timeout=5000) as popup_info:
-                link.click()
-            new_page = popup_info.value
-            new_page.wait_for_load_state("domcontentloaded", timeout=15000)
-            # Opcional: mantén la nueva pestaña como activa en tu ctx
-            try:
-                ctx.pages.insert(0, new_page)
-            except Exception:
-                pass
-            new_page.bring_to_front()
-            return {"ok": True, "message": f"Abrí el resultado {idx+1} en pestaña nueva", "url": new_page.url, "title": new_page.title()}
-        except Exception:
-            # Fallback final por href directo
-            try:
-                href = link.get_attribute("href")
-            except Exception:
-                href = None
-            if href:
-                page.goto(href, wait_until="domcontentloaded", timeout=15000)
-                return {"ok": True, "message": f"Abrí el resultado {idx+1} (href)", "url": page.url, "title": page.title()}
-            return {"ok": False, "error": f"No se pudo abrir el resultado {idx+1} (click, popup ni href)."}
-        
-
-def cierra(ctx):
-    try:
-        for page in ctx.pages:
-            page.close()
-        return {"ok": True, "message": "Cerradas todas las pestañas de este contexto."}
-    except Exception as e:
-        return {"ok": False, "error": f"No se pudieron cerrar las pestañas: {e}"}
-
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({"ok": False, "error": "Uso: python script.py [busca <keywords> | abre <URL> | cierra | selecciona <n>]"}, ensure_ascii=False))
-        sys.exit(1)
-
-    # 1) Asegura CDP
-    ready = ensure_browser_with_cdp()
-    if not ready.get("ok"):
-        print(json.dumps(ready, ensure_ascii=False))
-        sys.exit(1)
-
-    # 2) Conecta Playwright
-    p, browser, ctx = connect_playwright()
-
-    cmd = sys.argv[1].lower()
-    try:
-        if cmd == "busca":
-            keywords = " ".join(sys.argv[2:])
-            result = search(ctx, keywords)
-            print(json.dumps(result, ensure_ascii=False))
-
-        elif cmd == "abre":
-            url = " ".join(sys.argv[2:])
-            result = open_url(ctx, url)
-            print(json.dumps(result, ensure_ascii=False))
-
-        elif cmd == "selecciona":
-            option = " ".join(sys.argv[2:])
-            result = select(ctx, option)
-            print(json.dumps(result, ensure_ascii=False))
-
-        elif cmd == "cierra":
-            result = cierra(ctx)
-            # No cierro el Chrome externo; solo desconecto Playwright
-            print(json.dumps(result, ensure_ascii=False))
-
-        else:
-            print(json.dumps({"ok": False, "error": "Comando no reconocido. Usa: busca, abre, cierra o selecciona."}, ensure_ascii=False))
-
-    finally:
-        # Importante: mantener el navegador vivo
-        disconnect_only(p)
\ No newline at end of file
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
+import sys, time, subprocess, socket, os, json, re
+from pathlib import Path
+from urllib.parse import urlparse
+
+# Módulos auxiliares junto a este script (también al cargarlo como worker)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
+import Routing
+
+
+DEBUG_PORT = 9222
+USER_DATA_DIR = os.path.expandvars(r"%LOCALAPPDATA%\ChromiumDebugProfile")
+BROWSER_BIN  = r"C:\Users\Josem\AppData\Local\ms-playwright\chromium-1181\chrome-win\chrome.exe"
+
+# Resultados de la última búsqueda (para que "selecciona" vaya directo al href)
+SERP_FILE = Path(__file__).resolve().parent.parent / "State" / "chrome_serp.json"
+TABS_FILE = Path(__file__).resolve().parent.parent / "State" / "chrome_tabs.json"
+SERP_JS = """els => els.map(a => ({title: (a.querySelector('h3') || a).innerText.trim(), href: a.href}))
+                     .filter(r => r.href && r.href.startsWith('http'))"""
+
+# Perfil de enrutado si el comando no trae --perfil (ver Routing.py y Orders.json)
+DEFAULT_PROFILE = os.environ.get("ALFRED_CHROME_PROFILE", "normal")
+
+DETACHED_PROCESS = 0x00000008
+CREATE_NEW_PROCESS_GROUP = 0x00000200
+
+def emit(event: str, **data):
+    """Evento de progreso por stdout (protocolo en Core/Worker.py)."""
+    sys.stdout.write(json.dumps({"event": event, **data}) + "\n")
+    sys.stdout.flush()
+
+def _is_port_open(port:int)->bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(0.2)
+        return s.connect_ex(("127.0.0.1", port)) == 0
+
+def ensure_browser_with_cdp():
+    """Arranca (si hace falta) el navegador con CDP y devuelve JSON ok/error."""
+    if _is_port_open(DEBUG_PORT):
+        return {"ok": True, "message": "CDP ya estaba disponible"}
+    if not os.path.exists(BROWSER_BIN):
+        return {
+            "ok": False,
+            "error": f"No existe BROWSER_BIN: {BROWSER_BIN}. Edita la ruta a chromium/chrome."
+        }
+    args = [
+        BROWSER_BIN,
+        f"--remote-debugging-port={DEBUG_PORT}",
+        f"--user-data-dir={USER_DATA_DIR}",
+        "--no-first-run",
+        "--no-default-browser-check",
+    ]
+    subprocess.Popen(
+        args,
+        creationflags=DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP,
+        close_fds=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):  # ~10s
+        if _is_port_open(DEBUG_PORT):
+            return {"ok": True, "message": "CDP listo"}
+        time.sleep(0.1)
+    return {"ok": False, "error": "El navegador no abrió el puerto de depuración a tiempo."}
+
+def connect_playwright():
+    p = sync_playwright().start()
+    browser = p.chromium.connect_over_cdp(f"http://localhost:{DEBUG_PORT}")
+    ctx = browser.contexts[0] if browser.contexts else browser.new_context()
+    return p, browser, ctx
+
+def disconnect_only(p):
+    try:
+        p.stop()
+    except Exception:
+        pass
+
+class ChromeSession:
+    """
+    Conexión Playwright + CDP reutilizable. Cargado como worker residente
+    (Core/Worker.py) vive entre órdenes: playwright, el sondeo del puerto y
+    connect_over_cdp solo se pagan la primera vez o tras perder el navegador.
+    """
+    def __init__(self):
+        self.p = self.browser = self.ctx = None
+        self.routing = Routing.RoutedPages()
+
+    def alive(self) -> bool:
+        try:
+            return self.browser is not None and self.browser.is_connected()
+        except Exception:
+            return False
+
+    def close(self):
+        p, self.p, self.browser, self.ctx = self.p, None, None, None
+        if p is not None:
+            disconnect_only(p)
+
+    def context(self):
+        """Devuelve (ctx, None) o (None, error); reconecta si el navegador murió."""
+        if self.alive():
+            return self.ctx, None
+        self.close()
+        ready = ensure_browser_with_cdp()
+        if not ready.get("ok"):
+            return None, ready
+        try:
+            self.p, self.browser, self.ctx = connect_playwright()
+        except Exception as e:
+            self.close()
+            return None, {"ok": False, "error": f"No se pudo conectar por CDP: {e}"}
+        return self.ctx, None
+
+# En modo worker el módulo se importa una vez y la sesión se conserva
+RESIDENT = __name__ != "__main__"
+_SESSION = ChromeSession()
+
+# ---------- pool de pestañas ----------
+MAX_TABS = int(os.environ.get("ALFRED_CHROME_MAX_TABS", "6"))
+
+def _is_serp(url: str) -> bool:
+    u = urlparse(url or "")
+    return "google." in (u.hostname or "") and u.path.startswith("/search")
+
+def _target_id(ctx, page):
+    """Id CDP de la pestaña (estable entre procesos) o None."""
+    try:
+        cdp = ctx.new_cdp_session(page)
+        try:
+            return cdp.send("Target.getTargetInfo")["targetInfo"]["targetId"]
+        finally:
+            cdp.detach()
+    except Exception:
+        return None
+
+class TabPool:
+    """
+    Pestañas que ha abierto Alfred: una de búsqueda que se reutiliza y un LRU
+    acotado de pestañas de contenido. Al pasar de max_tabs se cierra la de
+    contenido usada hace más tiempo (la de búsqueda no cuenta para el desalojo,
+    pero sí para el total). Las pestañas del usuario ni se cuentan ni se cierran.
+    Sus ids CDP se guardan en TABS_FILE para reconocerlas sin proceso residente.
+    """
+    def __init__(self, max_tabs: int = MAX_TABS):
+        self.max_tabs = max_tabs
+        self.ctx = None
+        self.search = None
+        self.lru = []  # más antigua primero
+        self.ids = {}  # page -> id CDP
+
+    @staticmethod
+    def _open(page) -> bool:
+        try:
+            return page is not None and not page.is_closed()
+        except PlaywrightError:
+            return False
+
+    def owns(self, page) -> bool:
+        return page is not None and (page is self.search or any(pg is page for pg in self.lru))
+
+    def _save(self):
+        data = {"search": self.ids.get(self.search), "lru": [self.ids.get(pg) for pg in self.lru]}
+        try:
+            TABS_FILE.parent.mkdir(parents=True, exist_ok=True)
+            TABS_FILE.write_text(json.dumps(data), encoding="utf-8")
+        except OSError:
+            pass
+
+    def sync(self, ctx):
+        if ctx is not self.ctx:
+            try:
+                saved = json.loads(TABS_FILE.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                saved = {}
+            wanted = set(saved.get("lru") or []) | {saved.get("search")}
+            wanted.discard(None)
+            by_id = {}
+            if wanted:
+                for pg in ctx.pages:
+                    tid = _target_id(ctx, pg) if self._open(pg) else None
+                    if tid in wanted:
+                        by_id[tid] = pg
+            self.ctx = ctx
+            self.ids = {pg: tid for tid, pg in by_id.items()}
+            self.search = by_id.get(saved.get("search"))
+            self.lru = [by_id[t] for t in saved.get("lru") or [] if t in by_id and by_id[t] is not self.search]
+            return
+        self.lru = [pg for pg in self.lru if self._open(pg)]
+        if not self._open(self.search):
+            self.search = None
+
+    def _new_page(self, ctx):
+        page = ctx.new_page()
+        self.ids[page] = _target_id(ctx, page)
+        return page
+
+    def _evict(self, keep, max_tabs=None):
+        limit = max(1, max_tabs or self.max_tabs)
+        total = len(self.lru) + (1 if self.search else 0)
+        while total > limit:
+            victim = next((pg for pg in self.lru if pg is not keep), None)
+            if victim is None:
+                break
+            self.lru.remove(victim)
+            self.ids.pop(victim, None)
+            try:
+                victim.close()
+            except PlaywrightError:
+                pass
+            total -= 1
+
+    def search_tab(self, ctx, reuse: bool = True):
+        """Pestaña para una búsqueda: la de búsqueda actual o una nueva."""
+        self.sync(ctx)
+        if not (reuse and self.search is not None):
+            if self.search is not None:
+                self.lru.append(self.search)  # la SERP anterior queda como contenido
+            self.search = self._new_page(ctx)
+            self._evict(keep=self.search)
+        self._save()
+        return self.search
+
+    def content_tab(self, ctx, reuse: bool = False, max_tabs=None):
+        """Pestaña para abrir contenido: nueva (o la más reciente si reuse) y desalojo LRU."""
+        self.sync(ctx)
+        if reuse and self.lru:
+            page = self.lru.pop()
+        else:
+            page = self._new_page(ctx)
+        self.lru.append(page)
+        self._evict(keep=page, max_tabs=max_tabs)
+        self._save()
+        return page
+
+    def promote(self, page, opened_by=None):
+        """
+        La pestaña pasa a mostrar contenido (p.ej. la SERP tras 'selecciona').
+        Solo pestañas de Alfred, o un popup abierto desde una de ellas
+        (opened_by); las del usuario se dejan fuera del pool.
+        """
+        if page is None or not (self.owns(page) or self.owns(opened_by)):
+            return
+        if page is self.search:
+            self.search = None
+        if page in self.lru:
+            self.lru.remove(page)
+        if page not in self.ids:
+            self.ids[page] = _target_id(self.ctx, page) if self.ctx is not None else None
+        self.lru.append(page)
+        self._evict(keep=page)
+        self._save()
+
+    def reset(self):
+        self.search = None
+        self.lru = []
+        self.ids = {}
+        self._save()
+
+_TABS = TabPool()
+
+def _routed(page):
+    """Aplica a `page` el perfil de enrutado de la orden en curso (hasta que acabe)."""
+    return _SESSION.routing.attach(page)
+
+def last_navigated_page(ctx):
+    # de más nueva a más vieja
+    for p in reversed([pg for pg in ctx.pages if not pg.is_closed()]):
+        u = (p.url or "").lower()
+        t = (p.title() or "").lower()
+        if u and u != "about:blank" and not u.startswith("chrome://") and "nueva pestaña" not in t:
+            return p
+    # si todas son blank/newtab, devuelve la última igualmente
+    return ctx.pages[-1]
+
+# ---------- caché de la SERP ----------
+_SERP = {"page": None, "url": None, "query": "", "results": []}
+
+def _scrape_serp(page) -> list:
+    try:
+        return page.eval_on_selector_all("a:has(h3)", SERP_JS)
+    except PlaywrightError:
+        return []
+
+def _store_serp(page, query: str, results: list):
+    _SERP.update(page=page, url=page.url, query=query, results=results)
+    try:
+        SERP_FILE.parent.mkdir(parents=True, exist_ok=True)
+        SERP_FILE.write_text(json.dumps({"query": query, "url": page.url, "ts": int(time.time()),
+                                         "results": results}, ensure_ascii=False, indent=2), encoding="utf-8")
+    except OSError:
+        pass
+
+def _cached_serp(ctx):
+    """
+    (page, results) de la última búsqueda si sigue siendo válida:
+    - misma pestaña (proceso residente) aunque ya se haya navegado a un resultado;
+    - si no, la pestaña que aún muestra la URL guardada en SERP_FILE.
+    """
+    page = _SERP["page"]
+    if page is not None and _SERP["results"]:
+        try:
+            if not page.is_closed() and page.context == ctx:
+                return page, _SERP["results"]
+        except PlaywrightError:
+            pass
+    try:
+        data = json.loads(SERP_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None, []
+    for pg in reversed([pg for pg in ctx.pages if not pg.is_closed()]):
+        if pg.url == data.get("url"):
+            return pg, data.get("results") or []
+    return None, []
+
+def search(ctx, keywords: str, tab: str = "reuse"):
+    page = _routed(_TABS.search_tab(ctx, reuse=(tab != "new")))
+    ctx.current_page = page
+    page.goto("https://www.google.com", wait_until="domcontentloaded")
+    # Consentimiento (si aparece)
+    try:
+        page.locator("button:has-text('Acepto'), button:has-text('Accept all'), button:has-text('Acepto todo')").first.click(timeout=1500)
+    except Exception:
+        pass
+    box = page.locator('textarea[name="q"]')
+    box.fill(keywords)
+    page.keyboard.press("Enter")
+    try:
+        page.wait_for_selector("a h3", timeout=10000)
+    except PlaywrightTimeoutError:
+        return {"ok": False, "error": "No aparecieron resultados."}
+    count = page.locator("a h3:visible").count()
+    results = _scrape_serp(page)
+    _store_serp(page, keywords, results)
+    return {"ok": True, "message": f"Buscado: {keywords}", "results_visible": count,
+            "results": [{"n": i + 1, "title": r["title"]} for i, r in enumerate(results[:10])]}
+
+def open_url(ctx, url: str, tab: str = "new", max_tabs=None):
+    if not url.startswith("http"):  # añade https:// solo si falta
+        url = "https://" + url
+    page = _routed(_TABS.content_tab(ctx, reuse=(tab == "reuse"), max_tabs=max_tabs))
+    ctx.current_page = page
+    try:
+        page.goto(url, wait_until="domcontentloaded")
+    except PlaywrightError as e:
+        return {"ok": False, "error": f"No se pudo abrir la URL: {e}"}
+    return {"ok": True, "message": f"Abrí {url}", "url": page.url, "title": page.title()}
+
+NAV_TIMING_JS = """() => { const n = performance.getEntriesByType('navigation')[0];
+                            return n ? Math.round(n.domContentLoadedEventEnd) : null; }"""
+
+def _watch_navigation(page):
+    """
+    Anota el desenlace de la navegación principal de `page`: "status" de su
+    respuesta o "failure" (net::ERR_...) si falló. Devuelve (anotaciones, parar).
+    """
+    nav = {}
+
+    def _main(request) -> bool:
+        return request.is_navigation_request() and request.frame == page.main_frame
+
+    def on_response(response):
+        if _main(response.request):
+            nav["status"] = response.status
+
+    def on_failed(request):
+        if _main(request):
+            nav["failure"] = request.failure
+
+    page.on("response", on_response)
+    page.on("requestfailed", on_failed)
+
+    def stop():
+        page.remove_listener("response", on_response)
+        page.remove_listener("requestfailed", on_failed)
+    return nav, stop
+
+def open_many(ctx, urls_text: str, max_tabs=None, timeout_ms: int = 30000):
+    """
+    Abre varias URLs a la vez: primero lanza todas las navegaciones (sin
+    esperarlas, el navegador las carga en paralelo) y después espera a cada una.
+    El total es el de la más lenta, no la suma. dcl_ms es el domContentLoaded
+    de cada página medido por el propio navegador. Una URL que acaba en la
+    página de error de Chrome (DNS, conexión, TLS...) cuenta como fallida.
+    """
+    urls = [u if u.startswith("http") else "https://" + u
+            for u in re.split(r"[\s,]+", (urls_text or "").strip()) if u]
+    if not urls:
+        return {"ok": False, "error": "Indica al menos una URL."}
+    limit = max(max_tabs or _TABS.max_tabs, len(urls) + 1)  # que el lote no se desaloje a sí mismo
+
+    t0 = time.perf_counter()
+    launched = []
+    for url in urls:
+        page = _routed(_TABS.content_tab(ctx, max_tabs=limit))
+        nav, stop = _watch_navigation(page)  # antes de navegar, para no perder el desenlace
+        try:
+            page.evaluate("u => { window.location.href = u; }", url)
+            launched.append((url, page, nav, stop, None))
+        except PlaywrightError as e:
+            launched.append((url, page, nav, stop, str(e).splitlines()[0]))
+
+    results = []
+    deadline = time.perf_counter() + timeout_ms / 1000
+    for url, page, nav, stop, error in launched:
+        try:
+            if error is None:
+                remaining = max(1, int((deadline - time.perf_counter()) * 1000))
+                page.wait_for_url(lambda u: u != "about:blank", wait_until="domcontentloaded", timeout=remaining)
+                if page.url.startswith("chrome-error://") or nav.get("failure"):
+                    error = f"No se pudo abrir la URL: {nav.get('failure') or 'error de red'}"
+                else:
+                    results.append({"url": page.url, "ok": True, "status": nav.get("status"),
+                                    "title": page.title(), "dcl_ms": page.evaluate(NAV_TIMING_JS)})
+                    continue
+        except PlaywrightError as e:
+            error = str(e).splitlines()[0]
+        finally:
+            stop()
+        results.append({"url": url, "ok": False, "error": error})
+        emit("progress", message=f"No se pudo abrir {url}")
+
+    opened = sum(1 for r in results if r["ok"])
+    if opened:
+        ctx.current_page = next(launch[1] for launch, r in zip(launched, results) if r["ok"])
+    return {"ok": opened > 0, "message": f"Abiertas {opened} de {len(urls)}", "results": results,
+            "total_ms": int((time.perf_counter() - t0) * 1000)}
+
+def select(ctx, option: str):
+    if not getattr(ctx, "pages", None):
+        return {"ok": False, "error": "No hay pestañas abiertas."}
+
+    # 0) Valida opción
+    try:
+        idx = int(option) - 1  # 1-based -> 0-based
+    except ValueError:
+        return {"ok": False, "error": "Opción inválida (no numérica)."}
+    if idx < 0:
+        return {"ok": False, "error": "El índice debe ser >= 1."}
+
+    # Atajo: resultado ya conocido por la última búsqueda -> goto(href) directo
+    cached_page, cached = _cached_serp(ctx)
+    if cached_page is not None and idx < len(cached):
+        _routed(cached_page).bring_to_front()
+        try:
+            cached_page.goto(cached[idx]["href"], wait_until="domcontentloaded", timeout=15000)
+            _TABS.promote(cached_page)
+            return {"ok": True, "message": f"Abrí el resultado {idx+1}", "url": cached_page.url,
+                    "title": cached_page.title(), "cached": True}
+        except PlaywrightError:
+            pass  # sigue por el DOM
+
+    page = last_navigated_page(ctx)  # última pestaña creada (asumiendo que ctx.pages[0] es la activa)
+    if page is _SERP["page"] or _TABS.owns(page):
+        _routed(page)  # solo pestañas de Alfred, nunca las del usuario
+    page.bring_to_front()
+
+    # 1) Asegura que hay resultados con h3 (no solo visibles)
+    try:
+        page.wait_for_selector("a:has(h3)", timeout=10000)
+    except PlaywrightTimeoutError:
+        return {"ok": False, "error": "No hay resultados (a:has(h3))."}
+
+    # 3) Localiza TODOS los enlaces con h3 (sin :visible para permitir scroll)
+    links_all = page.locator("a:has(h3)")
+    count_all = links_all.count()
+    if count_all == 0:
+        return {"ok": False, "error": "No se encontraron enlaces con título (a>h3)."}
+
+    # 4) Si el índice no está disponible aún, intenta cargar más con scroll
+    if idx >= count_all:
+        seen = count_all
+        # Intenta varias veces (ajusta repeticiones/tiempos según tu UI)
+        for attempt in range(6):
+            emit("progress", message=f"Cargando más resultados ({seen} de {idx+1})", attempt=attempt + 1, links=seen)
+            # Desplázate al final y da tiempo a que cargue nuevo contenido
+            page.keyboard.press("End")
+            page.wait_for_timeout(400)
+            new_count = links_all.count()
+            if new_count > seen:
+                seen = new_count
+                if idx < seen:
+                    break
+
+        count_all = links_all.count()
+        if idx >= count_all:
+            return {"ok": False, "error": f"Índice fuera de rango: {idx+1} (hay {count_all})."}
+        # la página ha crecido: actualiza la caché para las siguientes selecciones
+        if _SERP["page"] is page or _SERP["url"] == page.url:
+            _store_serp(page, _SERP["query"], _scrape_serp(page))
+
+    # 5) Obtén el enlace objetivo y llévalo a la vista
+    link = links_all.nth(idx)
+    try:
+        link.scroll_into_view_if_needed()
+        # Asegura que se vuelva visible antes del click
+        link.wait_for(state="visible", timeout=5000)
+    except PlaywrightTimeoutError:
+        # A veces es visible ya o hay overlays; seguimos con el click y fallback
+        pass
+
+    # 6) Click con manejo de navegación, popup o href
+    try:
+        with page.expect_navigation(wait_until="domcontentloaded", timeout=15000):
+            link.click()
+        _TABS.promote(page)
+        return {"ok": True, "message": f"Abrí el resultado {idx+1}", "url": page.url, "title": page.title()}
+    except PlaywrightTimeoutError:
+        # Puede que se haya abierto una pestaña nueva (target=_blank)
+        try:
+            with page.expect_popup(timeout=5000) as popup_info:
+                link.click()
+            new_page = popup_info.value
+            new_page.wait_for_load_state("domcontentloaded", timeout=15000)
+            # Opcional: mantén la nueva pestaña como activa en tu ctx
+            try:
+                ctx.pages.insert(0, new_page)
+            except Exception:
+                pass
+            new_page.bring_to_front()
+            _TABS.promote(new_page, opened_by=page)
+            return {"ok": True, "message": f"Abrí el resultado {idx+1} en pestaña nueva", "url": new_page.url, "title": new_page.title()}
+        except Exception:
+            # Fallback final por href directo
+            try:
+                href = link.get_attribute("href")
+            except Exception:
+                href = None
+            if href:
+                page.goto(href, wait_until="domcontentloaded", timeout=15000)
+                _TABS.promote(page)
+                return {"ok": True, "message": f"Abrí el resultado {idx+1} (href)", "url": page.url, "title": page.title()}
+            return {"ok": False, "error": f"No se pudo abrir el resultado {idx+1} (click, popup ni href)."}
+        
+
+def cierra(ctx):
+    try:
+        for page in ctx.pages:
+            page.close()
+        _TABS.reset()
+        return {"ok": True, "message": "Cerradas todas las pestañas de este contexto."}
+    except Exception as e:
+        return {"ok": False, "error": f"No se pudieron cerrar las pestañas: {e}"}
+
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 2:
+        print(json.dumps({"ok": False, "error": "Uso: python script.py [busca <keywords> | abre <URL> | abre_varios <URL...> | cierra | selecciona <n> | bench [n]] [--perfil=fast|normal|full] [--tab=reuse|new] [--max_tabs=N]"}, ensure_ascii=False))
+        sys.exit(1)
+
+    cmd = argv[1].lower()
+    if cmd == "bench":
+        Routing.bench(int(argv[2]) if len(argv) >= 3 else 5)
+        return
+
+    # flags --clave=valor (options de Orders.json) fuera de los argumentos
+    flags = dict(a[2:].split("=", 1) for a in argv[2:] if a.startswith("--") and "=" in a)
+    words = [a for a in argv[2:] if not (a.startswith("--") and "=" in a)]
+    profile = flags.get("perfil") or DEFAULT_PROFILE
+
+    max_tabs = int(flags["max_tabs"]) if flags.get("max_tabs", "").isdigit() else None
+    handlers = {
+        "busca": lambda ctx, rest: search(ctx, rest, tab=flags.get("tab", "reuse")),
+        "abre": lambda ctx, rest: open_url(ctx, rest, tab=flags.get("tab", "new"), max_tabs=max_tabs),
+        "abre_varios": lambda ctx, rest: open_many(ctx, rest, max_tabs=max_tabs),
+        "selecciona": select,
+        "cierra": lambda ctx, _rest: cierra(ctx),
+    }
+    handler = handlers.get(cmd)
+    if handler is None:
+        print(json.dumps({"ok": False, "error": "Comando no reconocido. Usa: busca, abre, abre_varios, cierra o selecciona."}, ensure_ascii=False))
+        sys.exit(1)
+    rest = " ".join(words)
+
+    try:
+        # 1) CDP + Playwright (reutiliza la sesión si sigue viva)
+        # 2) Si el navegador se cae durante la orden, reconecta y reintenta una vez
+        for attempt in range(2):
+            ctx, error = _SESSION.context()
+            if error:
+                result = error
+                break
+            try:
+                blocklist = _SESSION.routing.begin(profile)
+                result = handler(ctx, rest)
+                result["perfil"] = profile
+                if blocklist:
+                    result["blocked"] = blocklist.blocked
+                break
+            except PlaywrightError as e:
+                if attempt == 0 and not _SESSION.alive():
+                    continue
+                result = {"ok": False, "error": f"Error de Playwright: {e}"}
+                break
+            finally:
+                # sin rutas entre órdenes: con el worker ocioso nadie las atendería
+                _SESSION.routing.end()
+        print(json.dumps(result, ensure_ascii=False))
+    finally:
+        # Importante: mantener el navegador vivo; "cierra" no cierra el Chrome externo.
+        # Ejecutado suelto (sin worker) solo se desconecta Playwright.
+        if not RESIDENT:
+            _SESSION.close()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
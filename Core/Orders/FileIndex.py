@@ -0,0 +1,235 @@
+"""
+Índice persistente de nombres de archivo para Files.py (SQLite en Core/State).
+
+Por cada raíz guarda sus carpetas (con mtime) y los archivos de cada carpeta
+indexados por nombre en minúsculas:
+  - La primera búsqueda bajo una raíz la recorre entera y construye el índice.
+  - Una búsqueda es una consulta al índice; si acierta (y el archivo sigue
+    existiendo) no se toca el disco.
+  - Si falla, refresco incremental: se hace stat de cada carpeta indexada y solo
+    se vuelven a listar las que cambiaron de mtime (archivos nuevos/borrados,
+    subcarpetas nuevas -> se indexan, desaparecidas -> se eliminan).
+Las reglas de carpetas omitidas (antivirus) se aplican al indexar; si cambian,
+la raíz se reconstruye.
+"""
+import os, time, sqlite3, threading
+from pathlib import Path
+from Fuzzy import TrigramIndex, rank_paths
+
+STATE = Path(__file__).resolve().parent.parent / "State"
+INDEX_DB = STATE / "files_index.sqlite3"
+SIMILAR_MAX_NAMES = int(os.environ.get("ALFRED_FILES_SIMILAR_MAX", "300000"))  # tope del índice de trigramas
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots(
+    root  TEXT PRIMARY KEY,
+    skip  TEXT NOT NULL,
+    built REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs(
+    id     INTEGER PRIMARY KEY,
+    root   TEXT NOT NULL,
+    parent INTEGER,
+    path   TEXT NOT NULL,
+    depth  INTEGER NOT NULL,
+    mtime  INTEGER NOT NULL,
+    UNIQUE(root, path)
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE TABLE IF NOT EXISTS files(
+    name  TEXT NOT NULL,
+    dir   INTEGER NOT NULL,
+    fname TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_name ON files(name);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+"""
+
+
+def _list_dir(path: str, skip_re):
+    """(mtime_ns, [(nombre_lower, nombre)], [subcarpetas]) o None si no es accesible."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return None
+    files, subdirs = [], []
+    for e in entries:
+        try:
+            is_dir = e.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            files.append((e.name.lower(), e.name))
+        elif not e.is_symlink() and not skip_re.search(e.path):
+            subdirs.append(e.path)
+    return mtime, files, subdirs
+
+
+class FileIndex:
+    """Índice compartido por el proceso; las operaciones se serializan con un lock."""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: Path = INDEX_DB):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._versions: dict[str, int] = {}   # sube con cada build/refresh con cambios
+        self._trigrams: dict[str, tuple] = {} # root -> (versión, TrigramIndex)
+
+    @classmethod
+    def shared(cls) -> "FileIndex":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    # ---------- escritura ----------
+    def _scan_tree(self, cur, root: str, top: str, parent, depth: int, skip_re, progress=None) -> int:
+        """Indexa la carpeta `top` y todo lo que cuelga de ella. Devuelve nº de carpetas."""
+        stack, count = [(top, parent, depth)], 0
+        while stack:
+            path, parent_id, d = stack.pop()
+            listing = _list_dir(path, skip_re)
+            if listing is None:
+                continue
+            mtime, files, subdirs = listing
+            cur.execute("INSERT INTO dirs(root, parent, path, depth, mtime) VALUES (?,?,?,?,?)",
+                        (root, parent_id, path, d, mtime))
+            dir_id = cur.lastrowid
+            cur.executemany("INSERT INTO files(name, dir, fname) VALUES (?,?,?)",
+                            [(low, dir_id, name) for low, name in files])
+            stack.extend((p, dir_id, d + 1) for p in subdirs)
+            count += 1
+            if progress:
+                progress(count, path)
+        return count
+
+    def _drop_subtree(self, cur, dir_id: int):
+        ids = [r[0] for r in cur.execute(
+            "WITH RECURSIVE sub(id) AS (SELECT ? UNION ALL SELECT d.id FROM dirs d JOIN sub ON d.parent = sub.id) "
+            "SELECT id FROM sub", (dir_id,))]
+        cur.executemany("DELETE FROM files WHERE dir = ?", [(i,) for i in ids])
+        cur.executemany("DELETE FROM dirs WHERE id = ?", [(i,) for i in ids])
+
+    def _rescan_dir(self, cur, root: str, dir_id: int, path: str, depth: int, skip_re):
+        """Vuelve a listar una carpeta cuyo mtime cambió."""
+        listing = _list_dir(path, skip_re)
+        if listing is None:
+            self._drop_subtree(cur, dir_id)
+            return
+        mtime, files, subdirs = listing
+        cur.execute("UPDATE dirs SET mtime = ? WHERE id = ?", (mtime, dir_id))
+        cur.execute("DELETE FROM files WHERE dir = ?", (dir_id,))
+        cur.executemany("INSERT INTO files(name, dir, fname) VALUES (?,?,?)",
+                        [(low, dir_id, name) for low, name in files])
+        known = dict(cur.execute("SELECT path, id FROM dirs WHERE parent = ?", (dir_id,)).fetchall())
+        for sub in subdirs:
+            if known.pop(sub, None) is None:
+                self._scan_tree(cur, root, sub, dir_id, depth + 1, skip_re)
+        for gone_id in known.values():
+            self._drop_subtree(cur, gone_id)
+
+    def build(self, root: str, skip_re, progress=None) -> int:
+        """(Re)construye el índice completo de `root`."""
+        with self._lock:
+            conn = self._db()
+            with conn:
+                cur = conn.cursor()
+                ids = [(r[0],) for r in cur.execute("SELECT id FROM dirs WHERE root = ?", (root,))]
+                cur.executemany("DELETE FROM files WHERE dir = ?", ids)
+                cur.execute("DELETE FROM dirs WHERE root = ?", (root,))
+                count = self._scan_tree(cur, root, root, None, 0, skip_re, progress)
+                cur.execute("INSERT OR REPLACE INTO roots(root, skip, built) VALUES (?,?,?)",
+                            (root, skip_re.pattern, time.time()))
+            self._versions[root] = self._versions.get(root, 0) + 1
+            return count
+
+    def refresh(self, root: str, skip_re) -> int:
+        """Refresco incremental: relista solo las carpetas con mtime distinto. Devuelve cuántas."""
+        with self._lock:
+            conn = self._db()
+            with conn:
+                cur = conn.cursor()
+                rows = cur.execute("SELECT id, path, depth, mtime FROM dirs WHERE root = ?", (root,)).fetchall()
+                changed = 0
+                for dir_id, path, depth, mtime in rows:
+                    try:
+                        current = os.stat(path).st_mtime_ns
+                    except OSError:
+                        current = None
+                    if current != mtime:
+                        self._rescan_dir(cur, root, dir_id, path, depth, skip_re)
+                        changed += 1
+            if changed:
+                self._versions[root] = self._versions.get(root, 0) + 1
+            return changed
+
+    # ---------- lectura ----------
+    def is_built(self, root: str, skip_re) -> bool:
+        with self._lock:
+            row = self._db().execute("SELECT skip FROM roots WHERE root = ?", (root,)).fetchone()
+        return row is not None and row[0] == skip_re.pattern
+
+    def probe(self, root: str, name: str) -> list:
+        """Rutas indexadas para `name` bajo `root`, las menos profundas primero."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT d.path, f.fname FROM files f JOIN dirs d ON d.id = f.dir "
+                "WHERE f.name = ? AND d.root = ? ORDER BY d.depth, d.path",
+                (name.lower(), root)).fetchall()
+        return [os.path.join(p, f) for p, f in rows]
+
+    def lookup(self, root: str, name: str, skip_re, progress=None) -> str | None:
+        """
+        Ruta de `name` bajo `root` o None.
+        Construye el índice si falta; si no hay acierto válido, refresca y repite.
+        """
+        if not self.is_built(root, skip_re):
+            self.build(root, skip_re, progress)
+        else:
+            hit = next((p for p in self.probe(root, name) if os.path.exists(p)), None)
+            if hit:
+                return hit
+            self.refresh(root, skip_re)
+        return next((p for p in self.probe(root, name) if os.path.exists(p)), None)
+
+    def similar(self, root: str, query: str, skip_re, k: int = 10, progress=None) -> list:
+        """
+        Coincidencias parciales/aproximadas bajo `root`: [{"path", "name", "score"}].
+        El índice de trigramas se arma con los nombres del índice y se rehace
+        solo si este cambió desde la última vez. Lanza ValueError si la raíz
+        tiene más de SIMILAR_MAX_NAMES nombres distintos (acotar la raíz).
+        """
+        if not self.is_built(root, skip_re):
+            self.build(root, skip_re, progress)
+        else:
+            self.refresh(root, skip_re)
+        with self._lock:
+            version = self._versions.get(root, 0)
+            cached = self._trigrams.get(root)
+            if cached is None or cached[0] != version:
+                (count,) = self._db().execute(
+                    "SELECT COUNT(DISTINCT f.name) FROM files f JOIN dirs d ON d.id = f.dir WHERE d.root = ?",
+                    (root,)).fetchone()
+                if count > SIMILAR_MAX_NAMES:
+                    raise ValueError(f"{root} tiene {count} nombres distintos (máx. {SIMILAR_MAX_NAMES}): "
+                                     f"usa una carpeta más concreta.")
+                names = (r[0] for r in self._db().execute(
+                    "SELECT DISTINCT f.name FROM files f JOIN dirs d ON d.id = f.dir WHERE d.root = ?", (root,)))
+                cached = self._trigrams[root] = (version, TrigramIndex(names))
+        scored = cached[1].search(query, k * 4)
+        return rank_paths(scored, lambda n: [p for p in self.probe(root, n) if os.path.exists(p)], k)
@@ -1,126 +1,377 @@
-import os, subprocess, sys, json, re
-
-# ---------- utilidades IO ----------
-def print(obj: dict):
-    """Imprime SOLO JSON por stdout y sale con código coherente."""
-    sys.stdout.write(json.dumps(obj, ensure_ascii=False))
-    sys.exit(0 if obj.get("ok") else 1)
-
-def _dbg(*args):
-    """Logs a stderr (seguro para el Bridge)."""
-    print(*args, file=sys.stderr)
-
-# ---------- normalización ----------
-def _norm_unidad(u):
-    """Acepta C / C: / C:\ y devuelve C:\ (o None si no es válida)."""
-    if u is None:
-        return None
-    try:
-        s = str(u).strip().replace("/", "\\").upper()
-    except Exception:
-        return None
-
-    # "C" o "C:" (con o sin una barra final)
-    m = re.fullmatch(r"([A-Z])(?::\\?)?$", s)
-    if m:
-        return m.group(1) + ":\\"
-
-    # "C:\"
-    if re.fullmatch(r"[A-Z]:\\", s):
-        return s
-
-    return None
-
-def _parse_unidad_y_archivo(a, b):
-    """Detecta cuál de (a,b) es unidad y cuál archivo. Devuelve (unidad_normalizada, archivo) o (None, None)."""
-    u1, u2 = _norm_unidad(a), _norm_unidad(b)
-    if u1:
-        return u1, (b or "")
-    if u2:
-        return u2, (a or "")
-    return None, None
-
-def find_file(root_dir, filename, skip_dirs=None):
-    """
-    Busca recursivamente 'filename' bajo 'root_dir', evitando carpetas de AV.
-    Devuelve: {"ok": True, "path": "..."} | {"ok": False, "error": "..."}
-    """
-    root = _norm_unidad(root_dir)
-    if root is None or not os.path.isdir(root):
-        return {"ok": False, "error": f"Raíz inválida o no accesible: {root_dir}"}
-
-    if not isinstance(filename, str) or not filename.strip():
-        return {"ok": False, "error": "Falta 'archivo'"}
-    name = filename.strip().lower()
-
-    if skip_dirs is None:
-        skip_dirs = [
-            r"norton", r"symantec", r"mcafee", r"avast", r"avg", r"kaspersky",
-            r"eset", r"nod32", r"bitdefender", r"trend", r"trendmicro", r"sophos",
-            r"panda", r"f-secure", r"fsecure", r"malwarebytes", r"webroot",
-            r"zonealarm", r"comodo", r"drweb", r"secureanywhere"
-        ]
-    skip_re = re.compile("|".join(skip_dirs), re.IGNORECASE)
-
-    for dirpath, dirs, files in os.walk(root, topdown=True, onerror=lambda e: None):
-        dirs[:] = [d for d in dirs if not skip_re.search(os.path.join(dirpath, d))]
-        for f in files:
-            if f.lower() == name:
-                return {"ok": True, "path": os.path.join(dirpath, f)}
-    return {"ok": False, "error": f"'{name}' no encontrado bajo {root}"}
-
-def run_file(path: str):
-    """Lanza un ejecutable en Windows sin bloquear el script."""
-    DETACHED_PROCESS = 0x00000008
-    CREATE_NEW_PROCESS_GROUP = 0x00000200
-    try:
-        if not path:
-            return {"ok": False, "error": "Ruta vacía."}
-        if not os.path.exists(path):
-            return {"ok": False, "error": f"No existe el archivo: {path}"}
-        subprocess.Popen(
-            [path],
-            creationflags=DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP,
-            close_fds=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-        return {"ok": True, "launched": path}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
-    
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print({"ok": False, "error": "Uso: python Files.py [busca <raiz> <archivo> | abre <archivo> [raiz]]"})
-
-    command = sys.argv[1].lower()
-    if command == "busca":
-        if len(sys.argv) < 4:
-            print({"ok": False, "error": "Uso: python Files.py busca <raiz> <archivo>"})
-        # acepta ambos órdenes
-        unidad, archivo = _parse_unidad_y_archivo(sys.argv[2], sys.argv[3])
-        if unidad is None:
-            print({"ok": False, "error": "Indica raíz válida (C / C: / C:\\) y archivo"})
-        print(find_file(unidad, archivo))
-
-    elif command == "abre":
-        # soporta:
-        #   abre <archivo>                → raíz por defecto C:\
-        #   abre <archivo> <raiz>         → detecta raíz
-        #   abre <raiz> <archivo>         → detecta raíz
-        if len(sys.argv) == 3:
-            unidad, archivo = "C:\\", sys.argv[2]
-        elif len(sys.argv) >= 4:
-            unidad, archivo = _parse_unidad_y_archivo(sys.argv[2], sys.argv[3])
-            if unidad is None:
-                print({"ok": False, "error": "Indica raíz válida (C / C: / C:\\) y archivo"})
-        else:
-            print({"ok": False, "error": "Uso: python Files.py abre <archivo> [raiz]"})
-
-        found = find_file(unidad, archivo)
-        if not found.get("ok"):
-            print(found)
-        print(run_file(found["path"]))
-
-    else:
-        print({"ok": False, "error": "Comando no reconocido. Usa: busca, abre."})
\ No newline at end of file
+import os, subprocess, sys, json, re, time, threading
+
+# Módulos auxiliares junto a este script (también al cargarlo como plugin)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
+from FileIndex import FileIndex
+from Walker import walk_find, walk_ranked
+from Catalog import Catalog
+from Fuzzy import substring_score, path_bonus
+import Ranking
+
+# Índice persistente de nombres (ALFRED_FILES_INDEX=0 -> recorrido completo cada vez)
+INDEX_ENABLED = os.environ.get("ALFRED_FILES_INDEX", "1") != "0"
+
+# Carpetas de antivirus que no se recorren (se aplica también al indexar)
+DEFAULT_SKIP_DIRS = [
+    r"norton", r"symantec", r"mcafee", r"avast", r"avg", r"kaspersky",
+    r"eset", r"nod32", r"bitdefender", r"trend", r"trendmicro", r"sophos",
+    r"panda", r"f-secure", r"fsecure", r"malwarebytes", r"webroot",
+    r"zonealarm", r"comodo", r"drweb", r"secureanywhere"
+]
+DEFAULT_SKIP_RE = re.compile("|".join(DEFAULT_SKIP_DIRS), re.IGNORECASE)
+
+# Catálogo residente (solo cargado como plugin, ver Core/Dispatcher.py):
+# ALFRED_FILES_ROOTS=C:\Users\yo;D:\ -> se vigilan esas raíces y busca responde de memoria
+CATALOG_ROOTS = [r.strip() for r in os.environ.get("ALFRED_FILES_ROOTS", "").split(os.pathsep) if r.strip()]
+_CATALOG = None
+_CATALOG_LOCK = threading.Lock()
+
+def catalog():
+    """Catálogo compartido (arrancado en segundo plano) o None si no aplica."""
+    global _CATALOG
+    if _CATALOG is None and CATALOG_ROOTS and __name__ != "__main__":
+        with _CATALOG_LOCK:
+            if _CATALOG is None:
+                _CATALOG = Catalog(CATALOG_ROOTS, DEFAULT_SKIP_RE).start()
+    return _CATALOG
+
+# ---------- utilidades IO ----------
+def jprint(obj: dict):
+    """Imprime SOLO JSON por stdout y sale con código coherente."""
+    sys.stdout.write(json.dumps(obj, ensure_ascii=False))
+    sys.exit(0 if obj.get("ok") else 1)
+
+# Eventos de progreso (protocolo en Core/Worker.py). En modo "inprocess" el
+# Dispatcher fija _EVENT_SINK.fn y los recibe sin pasar por stdout.
+_EVENT_SINK = threading.local()
+PROGRESS_EVERY_S = 1.0
+
+def emit(event: str, **data):
+    evt = {"event": event, **data}
+    fn = getattr(_EVENT_SINK, "fn", None)
+    if fn is not None:
+        fn(evt)
+    else:
+        sys.stdout.write(json.dumps(evt) + "\n")
+        sys.stdout.flush()
+
+def _dbg(*args):
+    """Logs a stderr (seguro para el Bridge)."""
+    print(*args, file=sys.stderr)
+
+# ---------- normalización ----------
+def _norm_unidad(u):
+    """Acepta C / C: / C:\ y devuelve C:\ (o None si no es válida)."""
+    if u is None:
+        return None
+    try:
+        s = str(u).strip().replace("/", "\\").upper()
+    except Exception:
+        return None
+
+    # "C" o "C:" (con o sin una barra final)
+    m = re.fullmatch(r"([A-Z])(?::\\?)?$", s)
+    if m:
+        return m.group(1) + ":\\"
+
+    # "C:\"
+    if re.fullmatch(r"[A-Z]:\\", s):
+        return s
+
+    return None
+
+def _parse_unidad_y_archivo(a, b):
+    """Detecta cuál de (a,b) es unidad y cuál archivo. Devuelve (unidad_normalizada, archivo) o (None, None)."""
+    u1, u2 = _norm_unidad(a), _norm_unidad(b)
+    if u1:
+        return u1, (b or "")
+    if u2:
+        return u2, (a or "")
+    return None, None
+
+def _scan_progress(label: str):
+    """Callback (carpetas, ruta) para el índice/recorrido: emite progreso como mucho una vez por PROGRESS_EVERY_S."""
+    lock = threading.Lock()
+    next_report = [time.monotonic() + PROGRESS_EVERY_S]
+    def report(count, path):
+        with lock:
+            if time.monotonic() < next_report[0]:
+                return
+            next_report[0] = time.monotonic() + PROGRESS_EVERY_S
+        emit("progress", message=f"{count} {label}", dirs=count, current=path)
+    return report
+
+def find_file(root_dir, filename, skip_dirs=None):
+    """
+    Busca recursivamente 'filename' bajo 'root_dir', evitando carpetas de AV.
+    Orden: catálogo residente (si la raíz está vigilada), índice persistente
+    (FileIndex) y, si está deshabilitado o falla, recorrido paralelo (Walker).
+    Devuelve: {"ok": True, "path": "..."} | {"ok": False, "error": "..."}
+    """
+    root = _norm_unidad(root_dir)
+    if root is None or not os.path.isdir(root):
+        return {"ok": False, "error": f"Raíz inválida o no accesible: {root_dir}"}
+
+    if not isinstance(filename, str) or not filename.strip():
+        return {"ok": False, "error": "Falta 'archivo'"}
+    name = filename.strip().lower()
+
+    skip_re = DEFAULT_SKIP_RE if skip_dirs is None else re.compile("|".join(skip_dirs), re.IGNORECASE)
+
+    cat = catalog() if skip_dirs is None else None
+    if cat is not None and cat.ready.is_set():
+        hit = next((p for p in cat.lookup(name, under=root) if os.path.exists(p)), None)
+        if hit:
+            return {"ok": True, "path": hit}
+        if cat.covers(root):
+            return {"ok": False, "error": f"'{name}' no encontrado bajo {root}"}
+
+    if INDEX_ENABLED:
+        try:
+            path = FileIndex.shared().lookup(root, name, skip_re, progress=_scan_progress("carpetas indexadas"))
+        except Exception as e:  # índice corrupto/bloqueado -> recorrido directo
+            _dbg(f"[files] índice no disponible: {e!r}")
+        else:
+            if path:
+                return {"ok": True, "path": path}
+            return {"ok": False, "error": f"'{name}' no encontrado bajo {root}"}
+
+    found = walk_find(root, name, skip_re, progress=_scan_progress("carpetas revisadas"))
+    if found:
+        return {"ok": True, "path": found[0]}
+    return {"ok": False, "error": f"'{name}' no encontrado bajo {root}"}
+
+FUZZY_TOP_K = 10
+
+def _in_configured_roots(root: str) -> bool:
+    """True si `root` está dentro de alguna raíz de ALFRED_FILES_ROOTS."""
+    root = os.path.normcase(os.path.abspath(root))
+    for r in CATALOG_ROOTS:
+        r = os.path.normcase(os.path.abspath(r))
+        if root == r or root.startswith(r.rstrip(os.sep) + os.sep):
+            return True
+    return False
+
+def find_similar(root_dir, query, k=FUZZY_TOP_K):
+    """
+    Nombres parecidos (subcadena o con erratas) bajo 'root_dir', por trigramas.
+    Solo dentro de ALFRED_FILES_ROOTS: usa el catálogo si está en marcha; si no,
+    el índice persistente de esa raíz.
+    Devuelve: {"ok": True, "matches": [{"path","name","score"}, ...]} | {"ok": False, "error": "..."}
+    """
+    root = _norm_unidad(root_dir)
+    if root is None or not os.path.isdir(root):
+        return {"ok": False, "error": f"Raíz inválida o no accesible: {root_dir}"}
+    if not isinstance(query, str) or not query.strip():
+        return {"ok": False, "error": "Falta 'archivo'"}
+    query = query.strip().lower()
+
+    if not _in_configured_roots(root):
+        return {"ok": False, "error": f"La búsqueda aproximada solo cubre las carpetas de ALFRED_FILES_ROOTS "
+                                      f"({os.pathsep.join(CATALOG_ROOTS) or 'sin configurar'}); {root} no está en ellas."}
+
+    cat = catalog()
+    if cat is not None and cat.ready.is_set() and cat.covers(root):
+        matches = cat.similar(query, under=root, k=k)
+    elif INDEX_ENABLED:
+        try:
+            matches = FileIndex.shared().similar(root, query, DEFAULT_SKIP_RE, k,
+                                                 progress=_scan_progress("carpetas indexadas"))
+        except ValueError as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            return {"ok": False, "error": f"Índice no disponible: {e!r}"}
+    else:
+        return {"ok": False, "error": "La búsqueda aproximada necesita el índice (ALFRED_FILES_INDEX) "
+                                      "o el catálogo (ALFRED_FILES_ROOTS)."}
+    if not matches:
+        return {"ok": False, "error": f"Nada parecido a '{query}' bajo {root}"}
+    return {"ok": True, "query": query, "matches": matches}
+
+LOCALIZA_MAX = 50        # coincidencias como mucho
+LOCALIZA_BUDGET_S = float(os.environ.get("ALFRED_LOCALIZA_BUDGET_S", "20"))
+
+def _parse_roots(unidades) -> list | None:
+    """'C D' / 'C:,D:' -> ['C:\\', 'D:\\']; None si alguna no es válida."""
+    roots = []
+    for tok in re.split(r"[\s,;]+", str(unidades or "").strip()):
+        if not tok:
+            continue
+        root = _norm_unidad(tok)
+        if root is None:
+            return None
+        if root not in roots:
+            roots.append(root)
+    return roots
+
+def locate(roots: list, query: str, max_matches=LOCALIZA_MAX, budget_s=LOCALIZA_BUDGET_S):
+    """
+    Busca `query` (nombre o parte del nombre) en varias raíces a la vez, empezando
+    por las carpetas más probables (Ranking.DirPriority). Cada coincidencia se
+    emite al momento como evento "partial"; al final, todas ordenadas por puntuación.
+    """
+    q = str(query or "").strip().lower()
+    if not q:
+        return {"ok": False, "error": "Falta 'archivo'"}
+    roots = [r for r in roots if os.path.isdir(r)]
+    if not roots:
+        return {"ok": False, "error": "Ninguna raíz accesible"}
+
+    prio = Ranking.DirPriority()
+    # las carpetas configuradas dentro de las raíces se siembran también (se visitan antes)
+    starts = [c for c in prio.configured if os.path.isdir(c)
+              and any(os.path.normcase(c).startswith(os.path.normcase(r)) for r in roots)] + roots
+
+    matches, lock = [], threading.Lock()
+    t0 = time.monotonic()
+    first_ms = [None]
+
+    def on_match(path, name_score, _dir_prio):
+        score = round(name_score + path_bonus(path) + prio.bonus(os.path.dirname(path)), 4)
+        item = {"path": path, "name": os.path.basename(path), "score": score}
+        with lock:
+            if first_ms[0] is None:
+                first_ms[0] = int((time.monotonic() - t0) * 1000)
+            matches.append(item)
+        emit("partial", data=item)
+
+    cancel = threading.Event()
+    timer = threading.Timer(budget_s, cancel.set)
+    timer.daemon = True
+    timer.start()
+    try:
+        walk_ranked(starts, lambda n: substring_score(q, n.lower()), prio.priority, on_match,
+                    skip_re=DEFAULT_SKIP_RE, max_matches=max_matches, cancel=cancel)
+    finally:
+        timer.cancel()
+    elapsed = int((time.monotonic() - t0) * 1000)
+    if not matches:
+        return {"ok": False, "error": f"'{q}' no encontrado bajo {', '.join(roots)}", "elapsed_ms": elapsed}
+    matches.sort(key=lambda m: -m["score"])
+    return {"ok": True, "query": q, "matches": matches, "first_match_ms": first_ms[0],
+            "elapsed_ms": elapsed, "truncated": cancel.is_set()}  # por tope de coincidencias o de tiempo
+
+def run_file(path: str):
+    """Lanza un ejecutable en Windows sin bloquear el script."""
+    DETACHED_PROCESS = 0x00000008
+    CREATE_NEW_PROCESS_GROUP = 0x00000200
+    try:
+        if not path:
+            return {"ok": False, "error": "Ruta vacía."}
+        if not os.path.exists(path):
+            return {"ok": False, "error": f"No existe el archivo: {path}"}
+        subprocess.Popen(
+            [path],
+            creationflags=DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP,
+            close_fds=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return {"ok": True, "launched": path}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+# ---------- entry points (modo en proceso, ver Orders.json) ----------
+def busca(unidad, archivo):
+    """files busca <unidad> <archivo> (acepta ambos órdenes)."""
+    root, name = _parse_unidad_y_archivo(unidad, archivo)
+    if root is None:
+        return {"ok": False, "error": "Indica raíz válida (C / C: / C:\\) y archivo"}
+    found = find_file(root, name)
+    if found.get("ok"):
+        Ranking.record_hit(found["path"])
+    return found
+
+def localiza(archivo, unidades=None):
+    """files localiza <archivo> [unidades]: todas las coincidencias, las más probables primero."""
+    roots = _parse_roots(unidades) if unidades else ["C:\\"]
+    if not roots:
+        return {"ok": False, "error": "Unidades inválidas (ej: C D)"}
+    return locate(roots, archivo)
+
+def similares(unidad, archivo):
+    """files similares <unidad> <archivo>: coincidencias aproximadas ordenadas."""
+    root, name = _parse_unidad_y_archivo(unidad, archivo)
+    if root is None:
+        return {"ok": False, "error": "Indica raíz válida (C / C: / C:\\) y archivo"}
+    return find_similar(root, name)
+
+def _open(root, name):
+    """
+    Busca y lanza. Sin coincidencia exacta solo lanza si algún nombre coincide
+    sin la extensión ("chrome" -> chrome.exe); si no, devuelve los parecidos
+    para que el usuario elija (nunca lanza una aproximada: "install" no abre
+    uninstall.exe).
+    """
+    found = find_file(root, name)
+    if found.get("ok"):
+        res = run_file(found["path"])
+    else:
+        near = find_similar(root, name)
+        q = name.strip().lower()
+        same_stem = [m for m in near.get("matches") or []
+                     if os.path.splitext(m["name"])[0].lower() == q]
+        if not same_stem:
+            if near.get("matches"):
+                return {"ok": False, "error": f"'{name}' no encontrado; ¿quizá alguno de estos? "
+                                              f"Ábrelo con su nombre exacto.", "matches": near["matches"]}
+            return found
+        res = run_file(same_stem[0]["path"])
+    if res.get("ok"):
+        Ranking.record_hit(res["launched"], weight=2.0)
+    return res
+
+def abre(unidad, archivo):
+    """files abre <unidad> <archivo>: busca y lanza el primero que encuentre."""
+    root, name = _parse_unidad_y_archivo(unidad, archivo)
+    if root is None:
+        return {"ok": False, "error": "Indica raíz válida (C / C: / C:\\) y archivo"}
+    return _open(root, name)
+
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 2:
+        jprint({"ok": False, "error": "Uso: python Files.py [busca <raiz> <archivo> | abre <archivo> [raiz] | similares <raiz> <archivo> | localiza <archivo> [unidades...]]"})
+
+    command = argv[1].lower()
+    if command == "busca":
+        if len(argv) < 4:
+            jprint({"ok": False, "error": "Uso: python Files.py busca <raiz> <archivo>"})
+        # acepta ambos órdenes
+        jprint(busca(argv[2], argv[3]))
+
+    elif command == "abre":
+        # soporta:
+        #   abre <archivo>                → raíz por defecto C:\
+        #   abre <archivo> <raiz>         → detecta raíz
+        #   abre <raiz> <archivo>         → detecta raíz
+        if len(argv) == 3:
+            unidad, archivo = "C:\\", argv[2]
+        elif len(argv) >= 4:
+            unidad, archivo = _parse_unidad_y_archivo(argv[2], argv[3])
+            if unidad is None:
+                jprint({"ok": False, "error": "Indica raíz válida (C / C: / C:\\) y archivo"})
+        else:
+            jprint({"ok": False, "error": "Uso: python Files.py abre <archivo> [raiz]"})
+
+        jprint(_open(unidad, archivo))
+
+    elif command == "localiza":
+        if len(argv) < 3:
+            jprint({"ok": False, "error": "Uso: python Files.py localiza <archivo> [unidades...]"})
+        jprint(localiza(argv[2], " ".join(argv[3:]) or None))
+
+    elif command == "similares":
+        if len(argv) < 4:
+            jprint({"ok": False, "error": "Uso: python Files.py similares <raiz> <archivo>"})
+        jprint(similares(argv[2], argv[3]))
+
+    else:
+        jprint({"ok": False, "error": "Comando no reconocido. Usa: busca, abre, similares, localiza."})
+
+if __name__ == "__main__":
+    main()
+else:
+    catalog()  # cargado como plugin: el catálogo se siembra ya
\ No newline at end of file
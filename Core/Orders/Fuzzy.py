@@ -0,0 +1,142 @@
+"""
+Índice invertido de trigramas sobre nombres de archivo para Files.py.
+
+Cada nombre (en minúsculas) se parte en trigramas con marcas de inicio/fin
+("\\x02chrome.exe\\x03" -> "\\x02ch", "chr", ..., "xe\\x03"). Una consulta puntúa
+cada candidato por similitud de Dice entre conjuntos de trigramas; los
+RERANK mejores se afinan con difflib (erratas y transposiciones como
+"chorme" -> "chrome") y con coincidencia de subcadena/prefijo. Después
+rank_paths aplica heurísticas de ruta (profundidad, ejecutables, temporales).
+Los nombres se indexan también sin extensión.
+
+Para no recorrer listas enormes, los candidatos nuevos solo salen de los
+trigramas más raros de la consulta (por palomar: quien comparta al menos
+`need` trigramas aparece en alguno de los len-need+1 más raros).
+"""
+import os, math, heapq
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+MIN_SHARED = 0.3     # fracción mínima de trigramas de la consulta compartidos
+MIN_SCORE = 0.3
+RERANK = 200         # candidatos que se afinan con difflib
+LAUNCH_EXTS = {".exe", ".lnk", ".bat", ".cmd", ".msi", ".url", ".appref-ms"}
+NOISE_DIRS = {"temp", "tmp", "cache", "$recycle.bin", "winsxs", "installer", "node_modules", ".git"}
+
+
+def trigrams(name: str) -> frozenset:
+    s = "\x02" + name + "\x03"
+    return frozenset(s[i:i + 3] for i in range(len(s) - 2))
+
+
+def name_grams(name: str) -> frozenset:
+    """Trigramas del nombre y de su raíz sin extensión."""
+    stem = os.path.splitext(name)[0]
+    return trigrams(name) | trigrams(stem) if stem and stem != name else trigrams(name)
+
+
+def substring_score(q: str, name: str) -> float | None:
+    """Puntuación si `q` está contenido en `name` (ambos en minúsculas); si no, None."""
+    if q == name:
+        return 1.0
+    if q not in name:
+        return None
+    if q == os.path.splitext(name)[0]:
+        return 0.95
+    return 0.75 + 0.15 * len(q) / len(name) + (0.05 if name.startswith(q) else 0.0)
+
+
+def _score(q: str, name: str, dice: float) -> float:
+    sub = substring_score(q, name)
+    if sub is not None:
+        return sub
+    stem = os.path.splitext(name)[0]
+    # aproximadas siempre por debajo de cualquier subcadena
+    ratio = max(SequenceMatcher(None, q, name).ratio(), SequenceMatcher(None, q, stem).ratio() if stem else 0.0)
+    return min(0.75, max(dice, ratio))
+
+
+class TrigramIndex:
+    """nombres -> trigramas, con listas invertidas trigram -> {nombres}."""
+
+    def __init__(self, names=()):
+        self.postings: dict[str, set] = defaultdict(set)
+        self.grams: dict[str, frozenset] = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.grams)
+
+    def add(self, name: str):
+        if name in self.grams:
+            return
+        g = name_grams(name)
+        self.grams[name] = g
+        for t in g:
+            self.postings[t].add(name)
+
+    def remove(self, name: str):
+        for t in self.grams.pop(name, ()):
+            bucket = self.postings.get(t)
+            if bucket is not None:
+                bucket.discard(name)
+                if not bucket:
+                    del self.postings[t]
+
+    def search(self, query: str, k: int = 10, min_score: float = MIN_SCORE) -> list:
+        """[(puntuación, nombre)] de mayor a menor, como mucho k."""
+        q = query.strip().lower()
+        if not q:
+            return []
+        qg = trigrams(q)
+        need = max(1, math.ceil(len(qg) * MIN_SHARED))
+        ordered = sorted(qg, key=lambda t: len(self.postings.get(t, ())))
+        seeds = len(ordered) - need + 1
+        shared: dict[str, int] = {}
+        for i, t in enumerate(ordered):
+            bucket = self.postings.get(t)
+            if not bucket:
+                continue
+            if i < seeds:
+                for name in bucket:
+                    shared[name] = shared.get(name, 0) + 1
+            else:  # solo suma a candidatos ya vistos; recorre el conjunto menor
+                for name in (bucket if len(bucket) < len(shared) else list(shared)):
+                    if name in shared and name in bucket:
+                        shared[name] += 1
+
+        prelim = [(2.0 * n / (len(qg) + len(self.grams[name])), name)
+                  for name, n in shared.items() if n >= need]
+        scored = []
+        for dice, name in heapq.nlargest(RERANK, prelim):
+            score = _score(q, name, dice)
+            if score >= min_score:
+                scored.append((round(score, 4), name))
+        scored.sort(key=lambda x: (-x[0], len(x[1]), x[1]))
+        return scored[:k]
+
+
+def path_bonus(path: str) -> float:
+    """Ajuste por ruta: ejecutables arriba, rutas profundas y carpetas temporales abajo."""
+    parts = [p.lower() for p in path.replace("\\", "/").split("/") if p]
+    bonus = -0.01 * min(len(parts), 15)
+    if os.path.splitext(path)[1].lower() in LAUNCH_EXTS:
+        bonus += 0.05
+    if any(p in NOISE_DIRS for p in parts[:-1]):
+        bonus -= 0.15
+    return bonus
+
+
+def rank_paths(scored: list, paths_for, k: int = 10) -> list:
+    """
+    scored: salida de TrigramIndex.search; paths_for(nombre) -> rutas de ese nombre.
+    Devuelve [{"path", "name", "score"}] ordenado, como mucho k.
+    """
+    out = []
+    for score, name in scored:
+        for path in paths_for(name):
+            out.append({"path": path, "name": os.path.basename(path),
+                        "score": round(score + path_bonus(path), 4)})
+    out.sort(key=lambda r: -r["score"])
+    return out[:k]
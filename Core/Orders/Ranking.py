@@ -0,0 +1,105 @@
+"""
+Prioridad de carpetas para la búsqueda multi-raíz de Files.py ("localiza").
+
+Fuentes, de más a menos peso:
+  - ALFRED_FILES_PRIORITY: carpetas configuradas (separadas por os.pathsep).
+  - Aciertos pasados guardados en Core/State/files_hits.json (cada "abre" que
+    lanza algo y cada "busca" que encuentra algo). Pesan por número de aciertos
+    y se desvanecen con el tiempo; la carpeta y todos sus ancestros suben, así
+    el recorrido baja directo hacia ellas.
+  - Heurísticas de nombre (perfil de usuario, Program Files, Escritorio... arriba;
+    Windows, papelera, temporales abajo) y profundidad.
+"""
+import os, json, math, time, threading
+from pathlib import Path
+
+STATE = Path(__file__).resolve().parent.parent / "State"
+HITS_FILE = STATE / "files_hits.json"
+HITS_MAX = 500                  # carpetas recordadas (se olvidan las menos recientes)
+HIT_HALF_LIFE_S = 30 * 86400    # un acierto pesa la mitad al cabo de un mes
+
+PREFERRED_DIRS = {"users", "program files", "program files (x86)", "desktop", "escritorio",
+                  "documents", "documentos", "downloads", "descargas", "appdata", "programs"}
+UNLIKELY_DIRS = {"windows", "$recycle.bin", "programdata", "winsxs", "system32", "temp", "tmp",
+                 "cache", "node_modules", ".git", "system volume information"}
+
+_lock = threading.Lock()
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.normpath(path))
+
+
+def configured_dirs() -> list:
+    raw = os.environ.get("ALFRED_FILES_PRIORITY", "")
+    return [os.path.normpath(os.path.expanduser(p.strip())) for p in raw.split(os.pathsep) if p.strip()]
+
+
+def load_hits() -> dict:
+    try:
+        with open(HITS_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def record_hit(path: str, weight: float = 1.0):
+    """Anota un acierto en la carpeta de `path` (archivo encontrado/lanzado)."""
+    folder = _key(os.path.dirname(path))
+    with _lock:
+        hits = load_hits()
+        entry = hits.get(folder) or {"n": 0.0, "t": 0}
+        entry["n"] = float(entry.get("n", 0)) + weight
+        entry["t"] = int(time.time())
+        hits[folder] = entry
+        if len(hits) > HITS_MAX:
+            hits = dict(sorted(hits.items(), key=lambda kv: kv[1].get("t", 0))[-HITS_MAX:])
+        try:
+            STATE.mkdir(parents=True, exist_ok=True)
+            tmp = HITS_FILE.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(hits, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, HITS_FILE)
+        except OSError:
+            pass
+
+
+class DirPriority:
+    """priority(ruta, profundidad) -> float (mayor = antes) y bonus(carpeta) para puntuar."""
+
+    def __init__(self, hits: dict | None = None, configured: list | None = None):
+        self.configured = [_key(p) for p in (configured_dirs() if configured is None else configured)]
+        self.hot: dict[str, float] = {}
+        now = time.time()
+        for folder, entry in (load_hits() if hits is None else hits).items():
+            age = max(0.0, now - float(entry.get("t", now)))
+            w = math.log1p(float(entry.get("n", 1))) * 0.5 ** (age / HIT_HALF_LIFE_S)
+            path = folder
+            while True:  # la carpeta y sus ancestros
+                if self.hot.get(path, 0.0) < w:
+                    self.hot[path] = w
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+
+    def _in_configured(self, key: str) -> bool:
+        return any(key == c or key.startswith(c.rstrip(os.sep) + os.sep) for c in self.configured)
+
+    def priority(self, path: str, depth: int) -> float:
+        key = _key(path)
+        score = -0.5 * depth + 3.0 * self.hot.get(key, 0.0)
+        if self._in_configured(key):
+            score += 10.0
+        base = os.path.basename(key)
+        if base in PREFERRED_DIRS:
+            score += 2.0
+        elif base in UNLIKELY_DIRS:
+            score -= 3.0
+        return score
+
+    def bonus(self, folder: str) -> float:
+        """Ajuste de puntuación (0..0.2) para coincidencias en `folder`."""
+        key = _key(folder)
+        b = 0.1 if self._in_configured(key) else 0.0
+        return round(b + min(0.1, 0.05 * self.hot.get(key, 0.0)), 4)
@@ -0,0 +1,198 @@
+"""
+Perfiles de enrutado de peticiones para el contexto Playwright de Chrome.py.
+
+  fast    bloquea imágenes, fuentes, media y hosts de publicidad/analítica
+  normal  bloquea solo hosts de publicidad/analítica
+  full    sin interceptar nada
+
+El perfil de cada comando se declara en Orders.json ("options": {"perfil": ...})
+y llega a Chrome.py como --perfil=<nombre>. Hosts extra: un fichero con un host
+por línea en ALFRED_CHROME_BLOCKLIST.
+
+Solo se enrutan las pestañas que usa Alfred y solo mientras dura la orden:
+Playwright síncrono atiende los handlers de route únicamente dentro de una
+llamada a su API, así que una ruta que quedara puesta con el worker ocioso
+dejaría colgadas las peticiones de esa pestaña (y en el contexto entero, todas
+las del usuario).
+
+Benchmark contra un servidor estático local con páginas pesadas:
+  python Core/Orders/Chrome.py bench [repeticiones]
+"""
+import os, sys, time, threading
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+AD_HOSTS = {
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "google-analytics.com",
+    "googletagmanager.com", "googletagservices.com", "adservice.google.com", "connect.facebook.net",
+    "scorecardresearch.com", "hotjar.com", "criteo.com", "criteo.net", "taboola.com", "outbrain.com",
+    "adnxs.com", "amazon-adsystem.com", "quantserve.com", "moatads.com", "pubmatic.com",
+    "rubiconproject.com", "casalemedia.com", "openx.net", "segment.io", "mixpanel.com",
+    "nr-data.net", "bat.bing.com", "clarity.ms", "mc.yandex.ru", "chartbeat.com", "optimizely.com",
+}
+HEAVY_TYPES = {"image", "media", "font"}
+
+
+class Blocklist:
+    """Decide si se aborta una petición por tipo de recurso o por host (incluye subdominios)."""
+
+    def __init__(self, types=(), hosts=()):
+        self.types = frozenset(types)
+        self.hosts = frozenset(h.lower().lstrip(".") for h in hosts)
+        self.blocked = 0
+
+    def host_blocked(self, host: str) -> bool:
+        host = host.lower()
+        while host:
+            if host in self.hosts:
+                return True
+            _, _, host = host.partition(".")
+        return False
+
+    def blocks(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.types:
+            return True
+        return bool(self.hosts) and self.host_blocked(urlsplit(url).hostname or "")
+
+    def handler(self, route):
+        """Handler para context.route("**/*", ...)."""
+        req = route.request
+        if self.blocks(req.resource_type, req.url):
+            self.blocked += 1
+            route.abort()
+        else:
+            route.continue_()
+
+
+def _extra_hosts() -> set:
+    path = os.environ.get("ALFRED_CHROME_BLOCKLIST")
+    if not path:
+        return set()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {ln.strip() for ln in f if ln.strip() and not ln.startswith("#")}
+    except OSError:
+        return set()
+
+
+def make_profile(name: str, extra_hosts=()) -> Blocklist | None:
+    """Blocklist del perfil o None para "full" (sin interceptar)."""
+    name = (name or "normal").lower()
+    if name == "full":
+        return None
+    hosts = AD_HOSTS | _extra_hosts() | set(extra_hosts)
+    if name == "fast":
+        return Blocklist(HEAVY_TYPES, hosts)
+    return Blocklist((), hosts)
+
+
+class RoutedPages:
+    """
+    Perfil de la orden en curso sobre las páginas que va usando:
+      begin(nombre) -> attach(page) por cada pestaña antes de navegar -> end().
+    end() quita todas las rutas (también si la orden falla).
+    """
+
+    def __init__(self):
+        self.blocklist: Blocklist | None = None
+        self.pages: list = []
+
+    def begin(self, name: str) -> Blocklist | None:
+        self.end()
+        self.blocklist = make_profile(name)
+        return self.blocklist
+
+    def attach(self, page):
+        if self.blocklist is None or any(pg is page for pg in self.pages):
+            return page
+        page.route("**/*", self.blocklist.handler)
+        self.pages.append(page)
+        return page
+
+    def end(self):
+        pages, self.pages = self.pages, []
+        for page in pages:
+            try:
+                if not page.is_closed():
+                    page.unroute("**/*", self.blocklist.handler)
+            except Exception:
+                pass
+
+
+# ---------- benchmark ----------
+_IMG = b"\x89PNG\r\n\x1a\n" + b"\0" * 200_000
+_FONT = b"wOF2" + b"\0" * 100_000
+_MEDIA = b"\0" * 1_000_000
+TRACKER_DELAY_S = 0.3
+
+
+def _page_html(port: int) -> bytes:
+    imgs = "".join(f'<img src="/img/{i}.png">' for i in range(30))
+    return f"""<!doctype html><html><head><meta charset="utf-8">
+<style>@font-face {{ font-family: X; src: url(/font.woff2); }} body {{ font-family: X; }}</style>
+<script src="http://tracker.localtest.me:{port}/track.js"></script>
+</head><body><h1>Página pesada</h1>{imgs}<video src="/media.mp4" autoplay muted></video>
+<p>contenido</p></body></html>""".encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/track.js":
+            time.sleep(TRACKER_DELAY_S)
+            body, ctype = b"window.tracked = true;", "application/javascript"
+        elif path.startswith("/img/"):
+            body, ctype = _IMG, "image/png"
+        elif path == "/font.woff2":
+            body, ctype = _FONT, "font/woff2"
+        elif path == "/media.mp4":
+            body, ctype = _MEDIA, "video/mp4"
+        else:
+            body, ctype = _page_html(self.server.server_address[1]), "text/html; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def bench(repeat: int = 5):
+    """Mide goto(domcontentloaded) y load por perfil en un Chromium headless."""
+    from playwright.sync_api import sync_playwright
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{port}/page"
+    p = sync_playwright().start()
+    try:
+        # *.localtest.me resuelve a 127.0.0.1; se fuerza por si no hay DNS
+        browser = p.chromium.launch(args=["--host-resolver-rules=MAP tracker.localtest.me 127.0.0.1"])
+        for name in ("full", "normal", "fast"):
+            dcl, load, blocked = [], [], 0
+            for _ in range(repeat):
+                ctx = browser.new_context()
+                bl = make_profile(name, extra_hosts={"tracker.localtest.me"})
+                if bl is not None:
+                    ctx.route("**/*", bl.handler)
+                page = ctx.new_page()
+                t0 = time.perf_counter()
+                page.goto(url, wait_until="domcontentloaded")
+                dcl.append(time.perf_counter() - t0)
+                page.wait_for_load_state("load")
+                load.append(time.perf_counter() - t0)
+                blocked += bl.blocked if bl else 0
+                ctx.close()
+            print(f"{name:7} domcontentloaded {1000 * sum(dcl) / repeat:7.1f} ms   "
+                  f"load {1000 * sum(load) / repeat:7.1f} ms   bloqueadas/página {blocked / repeat:.0f}")
+        browser.close()
+    finally:
+        p.stop()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) >= 2 else 5)
@@ -1,248 +1,752 @@
-import sys, json, time, subprocess, os
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from spotipy.exceptions import SpotifyException
-
-
-def load_creds_from_file():
-    # ruta ../State/data.txt relativa al script
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    state_path = os.path.normpath(os.path.join(base_dir, "..", "State", "data.txt"))
-
-    if not os.path.exists(state_path):
-        return {"ok": False, "error": f"No existe {state_path}"}
-
-    creds = {}
-    try:
-        with open(state_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-                if "=" in line:
-                    k, v = line.split("=", 1)
-                    creds[k.strip()] = v.strip()
-
-        cid  = creds.get("SPOTIFY_CLIENT_ID")
-        csec = creds.get("SPOTIFY_CLIENT_SECRET")
-        ruri = creds.get("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8888/callback")
-
-        if not cid or not csec:
-            return {"ok": False, "error": "Faltan CLIENT_ID o CLIENT_SECRET en data.txt"}
-
-        return {"ok": True, "CLIENT_ID": cid, "CLIENT_SECRET": csec, "REDIRECT_URI": ruri}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
-
-
-_creds = load_creds_from_file()
-if not _creds.get("ok"):
-    print(json.dumps({"ok": False, "error": _creds.get("error")}, ensure_ascii=False))
-    sys.exit(1)
-
-# ====== DATA ======
-CLIENT_ID     = _creds["CLIENT_ID"]
-CLIENT_SECRET = _creds["CLIENT_SECRET"]
-REDIRECT_URI  = _creds["REDIRECT_URI"]
-SCOPE = "user-modify-playback-state user-read-playback-state user-read-currently-playing"
-
-# ====== Helpers JSON / shell ======
-def jprint(payload: dict):
-    print(json.dumps(payload, ensure_ascii=False))
-    return 0 if payload.get("ok") else 1
-
-def open_spotify_app():
-    # Abre la app de Spotify en Windows (no bloquea)
-    try:
-        subprocess.Popen(["cmd", "/c", "start", "", "spotify:"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    except Exception:
-        pass
-    time.sleep(1.5)
-
-# ====== Auth ======
-sp = spotipy.Spotify(
-    auth_manager=SpotifyOAuth(
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-        redirect_uri=REDIRECT_URI,
-        scope=SCOPE
-    )
-)
-
-# ====== Core ======
-def list_devices():
-    try:
-        devices = sp.devices().get("devices", [])
-        data = [
-            {
-                "id": d.get("id"),
-                "name": d.get("name"),
-                "type": d.get("type"),
-                "is_active": d.get("is_active"),
-                "volume_percent": d.get("volume_percent")
-            }
-            for d in devices
-        ]
-        return {"ok": True, "devices": data}
-    except SpotifyException as e:
-        return {"ok": False, "error": f"Spotify API error: {e}"}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
-
-def pick_device_id(prefer: str | None = None):
-    """
-    Elige un device_id. prefer puede ser:
-      - "computer" / "smartphone" (por tipo)
-      - cualquier nombre parcial (case-insensitive)
-      - None -> activo si existe, si no el primero
-    """
-    devices = sp.devices().get("devices", [])
-    if not devices:
-        return None
-
-    # 1) si hay activo
-    active = next((d for d in devices if d.get("is_active")), None)
-    # 2) prefer por tipo
-    if prefer in ("computer", "smartphone"):
-        d = next((d for d in devices if d.get("type", "").lower() == prefer), None)
-        if d:
-            return d.get("id")
-    # 3) prefer por nombre parcial
-    if prefer and prefer not in ("computer", "smartphone"):
-        d = next((d for d in devices if prefer.lower() in (d.get("name") or "").lower()), None)
-        if d:
-            return d.get("id")
-    # 4) activo o primero
-    if active:
-        return active.get("id")
-    return devices[0].get("id")
-
-def ensure_active_device(prefer: str | None = None):
-    """
-    Garantiza un device activo: intenta seleccionar uno y transferir reproducción.
-    Devuelve {"ok":True, "device_id":..., "device_name":...} o {"ok":False,...}
-    """
-    try:
-        devices = sp.devices().get("devices", [])
-        if not devices:
-            open_spotify_app()
-            devices = sp.devices().get("devices", [])
-            if not devices:
-                return {"ok": False, "error": "No hay dispositivos de Spotify disponibles (abre la app de Spotify y reproduce algo un momento)."}
-
-        target_id = pick_device_id(prefer)
-        if not target_id:
-            return {"ok": False, "error": f"No se encontró un dispositivo adecuado (prefer='{prefer}')."}
-
-        # si no está activo, transfiere playback
-        info = next((d for d in devices if d.get("id") == target_id), {})
-        if not info.get("is_active"):
-            sp.transfer_playback(device_id=target_id, force_play=False)
-            time.sleep(0.5)
-
-        # devuelve info final
-        # refresca estado
-        devices2 = sp.devices().get("devices", [])
-        cur = next((d for d in devices2 if d.get("id") == target_id), info)
-        return {
-            "ok": True,
-            "device_id": target_id,
-            "device_name": cur.get("name"),
-            "device_type": cur.get("type"),
-            "is_active": cur.get("is_active")
-        }
-    except SpotifyException as e:
-        return {"ok": False, "error": f"Spotify API error: {e}"}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
-
-def play_song(query: str, prefer_device: str | None = None):
-    try:
-        dev = ensure_active_device(prefer_device)
-        if not dev.get("ok"):
-            return dev
-        device_id = dev["device_id"]
-
-        res = sp.search(q=query, type="track", limit=1)
-        tracks = res.get("tracks", {}).get("items", [])
-        if not tracks:
-            return {"ok": False, "error": f"No se encontró la canción: '{query}'"}
-
-        uri = tracks[0]["uri"]
-        sp.start_playback(device_id=device_id, uris=[uri])
-        return {"ok": True, "message": f"Reproduciendo: {tracks[0]['name']} · {tracks[0]['artists'][0]['name']}", "track_uri": uri, "device_id": device_id}
-    except SpotifyException as e:
-        return {"ok": False, "error": f"Spotify API error: {e}"}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
-
-def pause_song(prefer_device: str | None = None):
-    try:
-        dev = ensure_active_device(prefer_device)
-        if not dev.get("ok"):
-            return dev
-        sp.pause_playback(device_id=dev["device_id"])
-        return {"ok": True, "message": "Pausado", "device_id": dev["device_id"]}
-    except SpotifyException as e:
-        return {"ok": False, "error": f"Spotify API error: {e}"}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
-
-def next_song(prefer_device: str | None = None):
-    try:
-        dev = ensure_active_device(prefer_device)
-        if not dev.get("ok"):
-            return dev
-        sp.next_track(device_id=dev["device_id"])
-        return {"ok": True, "message": "Siguiente", "device_id": dev["device_id"]}
-    except SpotifyException as e:
-        return {"ok": False, "error": f"Spotify API error: {e}"}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
-
-def change_device(prefer: str):
-    # prefer puede ser "computer", "smartphone" o parte del nombre del dispositivo
-    try:
-        dev = ensure_active_device(prefer)
-        if not dev.get("ok"):
-            return dev
-        # Si ya está activo, simplemente lo reporta
-        return {"ok": True, "message": f"Dispositivo activo: {dev['device_name']} ({dev['device_type']})", "device_id": dev["device_id"]}
-    except SpotifyException as e:
-        return {"ok": False, "error": f"Spotify API error: {e}"}
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
-
-# ====== CLI ======
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        sys.exit(jprint({"ok": False, "error": "Uso: python spotify_cli.py [devices | device <computer|smartphone|nombre> | play <canción> [prefer] | pause [prefer] | next [prefer]]"}))
-
-    cmd = sys.argv[1].lower()
-
-    if cmd == "devices":
-        sys.exit(jprint(list_devices()))
-
-    elif cmd == "device":
-        if len(sys.argv) < 3:
-            sys.exit(jprint({"ok": False, "error": "Uso: device <computer|smartphone|nombre>"}))
-        prefer = sys.argv[2]
-        sys.exit(jprint(change_device(prefer)))
-
-    elif cmd == "play":
-        if len(sys.argv) < 3:
-            sys.exit(jprint({"ok": False, "error": "Uso: play <canción> [prefer]"}))
-        song = sys.argv[2]
-        prefer = sys.argv[3].lower() if len(sys.argv) >= 4 else None
-        sys.exit(jprint(play_song(song, prefer)))
-
-    elif cmd == "pause":
-        prefer = sys.argv[2].lower() if len(sys.argv) >= 3 else None
-        sys.exit(jprint(pause_song(prefer)))
-
-    elif cmd == "next":
-        prefer = sys.argv[2].lower() if len(sys.argv) >= 3 else None
-        sys.exit(jprint(next_song(prefer)))
-
-    else:
-        sys.exit(jprint({"ok": False, "error": "Comando no reconocido. Usa: devices | device | play | pause | next"}))
+import sys, json, time, subprocess, os, re, random, atexit, shutil, threading, tempfile, unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import spotipy
+from spotipy.oauth2 import SpotifyOAuth
+from spotipy.cache_handler import CacheFileHandler
+from spotipy.exceptions import SpotifyException
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
+
+
+def load_creds_from_file():
+    # ruta ../State/data.txt relativa al script
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    state_path = os.path.normpath(os.path.join(base_dir, "..", "State", "data.txt"))
+
+    if not os.path.exists(state_path):
+        return {"ok": False, "error": f"No existe {state_path}"}
+
+    creds = {}
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if "=" in line:
+                    k, v = line.split("=", 1)
+                    creds[k.strip()] = v.strip()
+
+        cid  = creds.get("SPOTIFY_CLIENT_ID")
+        csec = creds.get("SPOTIFY_CLIENT_SECRET")
+        ruri = creds.get("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8888/callback")
+
+        if not cid or not csec:
+            return {"ok": False, "error": "Faltan CLIENT_ID o CLIENT_SECRET en data.txt"}
+
+        return {"ok": True, "CLIENT_ID": cid, "CLIENT_SECRET": csec, "REDIRECT_URI": ruri}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+# ====== DATA ======
+SCOPE = "user-modify-playback-state user-read-playback-state user-read-currently-playing"
+
+# ALFRED_SPOTIFY_FAKE=1: cliente falso (SpotifyFake.py) y cachés en una carpeta temporal
+FAKE = os.environ.get("ALFRED_SPOTIFY_FAKE", "0").lower() in ("1", "true", "yes")
+STATE = (Path(tempfile.gettempdir()) / "alfred_spotify_fake") if FAKE else Path(__file__).resolve().parent.parent / "State"
+DEVICES_FILE = STATE / "spotify_devices.json"
+DEVICE_TTL_S = float(os.environ.get("ALFRED_SPOTIFY_DEVICE_TTL", "30"))
+TRANSFER_WAIT_S = 3.0   # espera máxima a que el dispositivo pase a activo
+APP_WAIT_S = 8.0        # espera máxima a que aparezca la app recién abierta
+TOKEN_FILE = STATE / "spotify_token.json"   # compartido por todos los procesos
+LEGACY_TOKEN_FILE = Path(__file__).resolve().parent.parent / ".cache"  # el de spotipy por defecto (cwd = Core/)
+TOKEN_MARGIN_S = 120    # se renueva el token este margen antes de que caduque
+RESIDENT = __name__ != "__main__"  # importado por Core/Worker.py (proceso persistente)
+TRACKS_FILE = STATE / "spotify_tracks.json"
+TRACKS_MAX = int(os.environ.get("ALFRED_SPOTIFY_TRACKS_MAX", "500"))
+TRACKS_TTL_S = float(os.environ.get("ALFRED_SPOTIFY_TRACKS_TTL", "0"))  # 0 = no caducan
+TRACKS_FLUSH_S = 30.0   # como mucho una escritura de estadísticas cada tanto (y al salir)
+COLA_WORKERS = int(os.environ.get("ALFRED_SPOTIFY_COLA_WORKERS", "4"))
+COLA_MAX = 50           # canciones por orden "cola"
+BACKOFF_MAX_S = float(os.environ.get("ALFRED_SPOTIFY_BACKOFF_MAX_S", "20"))     # espera total ante 429
+NEXT_MAX = 50           # canciones que puede saltar un solo "next"
+COALESCE_S = float(os.environ.get("ALFRED_SPOTIFY_COALESCE_MS", "250")) / 1000  # 0 = sin agrupar
+
+# ====== Helpers JSON / shell ======
+def jprint(payload: dict):
+    failed = _take_failed_control()
+    if failed:  # next/pause diferido que falló después de responder
+        payload["previous_error"] = failed.get("error")
+    print(json.dumps(payload, ensure_ascii=False))
+    return 0 if payload.get("ok") else 1
+
+def open_spotify_app():
+    # Abre la app de Spotify en Windows (no bloquea)
+    try:
+        subprocess.Popen(["cmd", "/c", "start", "", "spotify:"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception:
+        pass
+
+# ====== Auth (perezosa: no se toca nada hasta la primera llamada a la API) ======
+_sp = None
+_client_lock = threading.Lock()
+
+def _refresh_token(auth: SpotifyOAuth):
+    """Renueva el token si está a punto de caducar (otro proceso puede haberlo hecho ya)."""
+    try:
+        token = auth.cache_handler.get_cached_token()
+        if token and token.get("expires_at", 0) - time.time() <= TOKEN_MARGIN_S:
+            auth.refresh_access_token(token["refresh_token"])
+    except Exception:
+        pass  # la próxima llamada a la API lo reintentará por su cuenta
+    _schedule_refresh(auth)
+
+def _schedule_refresh(auth: SpotifyOAuth):
+    """Programa la renovación en segundo plano antes de que caduque el token."""
+    token = auth.cache_handler.get_cached_token()
+    if not token:
+        return
+    delay = max(5.0, token.get("expires_at", 0) - time.time() - TOKEN_MARGIN_S)
+    timer = threading.Timer(delay, _refresh_token, args=(auth,))
+    timer.daemon = True
+    timer.start()
+
+def _migrate_token():
+    """Copia una vez el token de LEGACY_TOKEN_FILE para no volver a pedir el login."""
+    if TOKEN_FILE.exists() or not LEGACY_TOKEN_FILE.exists():
+        return
+    try:
+        STATE.mkdir(parents=True, exist_ok=True)
+        tmp = TOKEN_FILE.with_suffix(".json.tmp")
+        shutil.copyfile(LEGACY_TOKEN_FILE, tmp)
+        os.replace(tmp, TOKEN_FILE)
+    except OSError:
+        pass  # sin copia: spotipy pedirá el login como antes
+
+def get_client():
+    """Crea (una vez) el cliente de Spotify. Lanza RuntimeError si faltan credenciales."""
+    global _sp
+    with _client_lock:
+        if _sp is None and FAKE:
+            from SpotifyFake import FakeSpotify
+            _sp = FakeSpotify()
+        if _sp is None:
+            creds = load_creds_from_file()
+            if not creds.get("ok"):
+                raise RuntimeError(creds.get("error"))
+            _migrate_token()
+            auth = SpotifyOAuth(
+                client_id=creds["CLIENT_ID"],
+                client_secret=creds["CLIENT_SECRET"],
+                redirect_uri=creds["REDIRECT_URI"],
+                scope=SCOPE,
+                cache_handler=CacheFileHandler(cache_path=str(TOKEN_FILE))
+            )
+            _sp = spotipy.Spotify(auth_manager=auth)
+            if RESIDENT:
+                _schedule_refresh(auth)
+    return _sp
+
+# ====== Límite de peticiones (429) ======
+def _retry_after(e: SpotifyException) -> float | None:
+    headers = getattr(e, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def api_call(fn, *args, **kwargs):
+    """
+    Llama a la API reintentando los 429: espera lo que diga Retry-After (o
+    0.5s, 1s, 2s... si no viene) más un margen aleatorio, para que varios
+    procesos no vuelvan a la vez. Se rinde pasados BACKOFF_MAX_S de espera.
+    """
+    waited, attempt = 0.0, 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except SpotifyException as e:
+            if getattr(e, "http_status", None) != 429:
+                raise
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                delay = retry_after + random.uniform(0, 0.25 * retry_after + 0.1)
+            else:
+                delay = 0.5 * 2 ** attempt * random.uniform(0.5, 1.0)
+            if waited + delay > BACKOFF_MAX_S:
+                raise
+            time.sleep(delay)
+            waited += delay
+            attempt += 1
+
+# ====== Caché de dispositivos ======
+# Una sola consulta a devices() por comando mientras la instantánea esté fresca.
+# Se guarda en Core/State para compartirla entre procesos; se refresca al
+# caducar o cuando una llamada de reproducción falla por el dispositivo.
+_DEVICES = {"t": 0.0, "devices": None}
+
+def _load_devices_file():
+    try:
+        with open(DEVICES_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get("devices"), list):
+            return float(data.get("t", 0)), data["devices"]
+    except (OSError, ValueError):
+        pass
+    return 0.0, None
+
+def _store_devices(devices: list):
+    _DEVICES["t"], _DEVICES["devices"] = time.time(), devices
+    try:
+        STATE.mkdir(parents=True, exist_ok=True)
+        tmp = DEVICES_FILE.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({"t": _DEVICES["t"], "devices": devices}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, DEVICES_FILE)
+    except OSError:
+        pass
+
+def invalidate_devices():
+    _DEVICES["t"], _DEVICES["devices"] = 0.0, None
+    try:
+        DEVICES_FILE.unlink()
+    except OSError:
+        pass
+
+def get_devices(refresh: bool = False) -> list:
+    """Instantánea de dispositivos; solo llama a la API si está caducada o refresh=True."""
+    if not refresh:
+        if _DEVICES["devices"] is None or time.time() - _DEVICES["t"] > DEVICE_TTL_S:
+            t, devices = _load_devices_file()
+            if devices is not None:
+                _DEVICES["t"], _DEVICES["devices"] = t, devices
+        if _DEVICES["devices"] is not None and time.time() - _DEVICES["t"] <= DEVICE_TTL_S:
+            return _DEVICES["devices"]
+    devices = api_call(get_client().devices).get("devices", [])
+    _store_devices(devices)
+    return devices
+
+def poll_devices(done, timeout: float) -> list:
+    """Refresca dispositivos con espera creciente (0.1s..0.5s) hasta done(devices) o timeout."""
+    deadline = time.monotonic() + timeout
+    step = 0.1
+    while True:
+        devices = get_devices(refresh=True)
+        if done(devices) or time.monotonic() >= deadline:
+            return devices
+        time.sleep(min(step, max(0.0, deadline - time.monotonic())))
+        step = min(step * 2, 0.5)
+
+def is_device_error(e: SpotifyException) -> bool:
+    """
+    Errores que indican que la instantánea de dispositivos ya no vale: 404 con
+    reason NO_ACTIVE_DEVICE o cuerpo "Device not found". No vale buscar "device"
+    en str(e): el mensaje de spotipy incluye la URL, con ?device_id=...
+    """
+    if getattr(e, "http_status", None) != 404:
+        return False
+    reason = str(getattr(e, "reason", "") or "").upper()
+    return reason == "NO_ACTIVE_DEVICE" or "device not found" in str(getattr(e, "msg", "") or "").lower()
+
+def on_device(prefer, action):
+    """
+    Asegura dispositivo y ejecuta action(device_id). Si falla por el dispositivo,
+    refresca la caché y reintenta una vez. Devuelve (dev, resultado_de_action).
+    """
+    for attempt in (0, 1):
+        dev = ensure_active_device(prefer, refresh=attempt > 0)
+        if not dev.get("ok"):
+            return dev, None
+        try:
+            return dev, action(dev["device_id"])
+        except SpotifyException as e:
+            if attempt or not is_device_error(e):
+                raise
+            invalidate_devices()
+
+# ====== Caché de canciones ======
+def normalize_query(query: str) -> str:
+    """minúsculas, sin tildes y con los espacios colapsados."""
+    q = unicodedata.normalize("NFKD", query or "")
+    q = "".join(c for c in q if not unicodedata.combining(c))
+    return " ".join(q.lower().split())
+
+class TrackCache:
+    """
+    LRU en disco: consulta normalizada -> {"uri", "name", "artist"}. Un acierto
+    evita sp.search(). Guarda estadísticas para ver cuánta latencia se ahorra
+    (aciertos x media de lo que tarda una búsqueda real).
+    Un acierto no escribe a disco: los contadores se acumulan en memoria
+    (`delta`) y se vuelcan con el siguiente put, cada TRACKS_FLUSH_S o al salir.
+    """
+    _ZERO = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "search_ms": 0.0}
+
+    def __init__(self, path: Path = TRACKS_FILE, max_items: int = TRACKS_MAX, ttl_s: float = TRACKS_TTL_S):
+        self.path = path
+        self.max_items = max(1, max_items)
+        self.ttl_s = ttl_s
+        self.entries: OrderedDict = OrderedDict()
+        self.stats = dict(self._ZERO)   # lo que hay en disco
+        self.delta = dict(self._ZERO)   # lo acumulado aquí y aún no guardado
+        self._dirty = False             # orden LRU / caducadas pendientes de guardar
+        self._flushed = time.monotonic()
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Relee el fichero si otro proceso lo ha cambiado."""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.entries = OrderedDict((k, v) for k, v in data.get("entries", []) if isinstance(v, dict))
+        self.stats = dict(self._ZERO, **data.get("stats", {}))
+        self._mtime = mtime
+
+    def _merged(self) -> dict:
+        return {k: self.stats.get(k, 0) + self.delta[k] for k in self._ZERO}
+
+    def _save(self):
+        try:
+            STATE.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".json.tmp")
+            stats = self._merged()
+            data = {"entries": list(self.entries.items()), "stats": stats}
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._mtime = self.path.stat().st_mtime_ns
+            self.stats, self.delta, self._dirty = stats, dict(self._ZERO), False
+            self._flushed = time.monotonic()
+        except OSError:
+            pass
+
+    def flush(self):
+        """Vuelca contadores y orden LRU pendientes (se llama también al salir)."""
+        with self._lock:
+            if self._dirty or any(self.delta.values()):
+                self._load()
+                self._save()
+
+    def get(self, query: str) -> dict | None:
+        key = normalize_query(query)
+        with self._lock:
+            self._load()
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl_s and time.time() - entry.get("added", 0) > self.ttl_s:
+                del self.entries[key]
+                self.delta["expired"] += 1
+                entry = None
+            if entry is None:
+                self.delta["misses"] += 1
+            else:
+                self.entries.move_to_end(key)
+                self.delta["hits"] += 1
+            self._dirty = True
+            if time.monotonic() - self._flushed >= TRACKS_FLUSH_S:
+                self._save()
+            return entry
+
+    def put(self, query: str, uri: str, name: str, artist: str, search_ms: float = 0.0):
+        key = normalize_query(query)
+        with self._lock:
+            self._load()
+            self.entries[key] = {"uri": uri, "name": name, "artist": artist, "added": time.time()}
+            self.entries.move_to_end(key)
+            self.delta["search_ms"] += search_ms
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+                self.delta["evicted"] += 1
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.stats, self.delta = dict(self._ZERO), dict(self._ZERO)
+            self._save()
+
+    def summary(self) -> dict:
+        with self._lock:
+            self._load()
+            st = self._merged()
+        lookups = st["hits"] + st["misses"]
+        avg_ms = st["search_ms"] / st["misses"] if st["misses"] else 0.0
+        return {"entries": len(self.entries), "max": self.max_items, "ttl_s": self.ttl_s,
+                "hits": st["hits"], "misses": st["misses"], "expired": st["expired"], "evicted": st["evicted"],
+                "hit_rate": round(st["hits"] / lookups, 3) if lookups else 0.0,
+                "avg_search_ms": round(avg_ms, 1), "saved_ms": round(st["hits"] * avg_ms)}
+
+_TRACKS = TrackCache()
+atexit.register(_TRACKS.flush)
+
+# ====== Core ======
+def list_devices():
+    try:
+        devices = get_devices()
+        data = [
+            {
+                "id": d.get("id"),
+                "name": d.get("name"),
+                "type": d.get("type"),
+                "is_active": d.get("is_active"),
+                "volume_percent": d.get("volume_percent")
+            }
+            for d in devices
+        ]
+        return {"ok": True, "devices": data}
+    except SpotifyException as e:
+        return {"ok": False, "error": f"Spotify API error: {e}"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+def pick_device_id(prefer: str | None = None, devices: list | None = None):
+    """
+    Elige un device_id. prefer puede ser:
+      - "computer" / "smartphone" (por tipo)
+      - cualquier nombre parcial (case-insensitive)
+      - None -> activo si existe, si no el primero
+    devices: instantánea ya obtenida (si no, la de la caché).
+    """
+    if devices is None:
+        devices = get_devices()
+    if not devices:
+        return None
+    prefer = prefer.lower() if prefer else None
+
+    # 1) si hay activo
+    active = next((d for d in devices if d.get("is_active")), None)
+    # 2) prefer por tipo
+    if prefer in ("computer", "smartphone"):
+        d = next((d for d in devices if d.get("type", "").lower() == prefer), None)
+        if d:
+            return d.get("id")
+    # 3) prefer por nombre parcial
+    if prefer and prefer not in ("computer", "smartphone"):
+        d = next((d for d in devices if prefer.lower() in (d.get("name") or "").lower()), None)
+        if d:
+            return d.get("id")
+    # 4) activo o primero
+    if active:
+        return active.get("id")
+    return devices[0].get("id")
+
+def ensure_active_device(prefer: str | None = None, refresh: bool = False):
+    """
+    Garantiza un device activo: intenta seleccionar uno y transferir reproducción.
+    Devuelve {"ok":True, "device_id":..., "device_name":...} o {"ok":False,...}
+    """
+    try:
+        devices = get_devices(refresh)
+        if not devices and not refresh:
+            devices = get_devices(refresh=True)
+        if not devices:
+            open_spotify_app()
+            devices = poll_devices(bool, APP_WAIT_S)
+            if not devices:
+                return {"ok": False, "error": "No hay dispositivos de Spotify disponibles (abre la app de Spotify y reproduce algo un momento)."}
+
+        target_id = pick_device_id(prefer, devices)
+        if not target_id:
+            return {"ok": False, "error": f"No se encontró un dispositivo adecuado (prefer='{prefer}')."}
+
+        # si no está activo, transfiere playback y espera (acotado) a que lo esté
+        cur = next((d for d in devices if d.get("id") == target_id), {})
+        if not cur.get("is_active"):
+            api_call(get_client().transfer_playback, device_id=target_id, force_play=False)
+            active = lambda ds: next((d for d in ds if d.get("id") == target_id and d.get("is_active")), None)
+            cur = active(poll_devices(active, TRANSFER_WAIT_S)) or cur
+        return {
+            "ok": True,
+            "device_id": target_id,
+            "device_name": cur.get("name"),
+            "device_type": cur.get("type"),
+            "is_active": cur.get("is_active")
+        }
+    except SpotifyException as e:
+        return {"ok": False, "error": f"Spotify API error: {e}"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+def resolve_track(query: str) -> dict | None:
+    """{"uri", "name", "artist"} de la primera canción para `query` (caché o búsqueda); None si no hay."""
+    track = _TRACKS.get(query)
+    if track is None:
+        t0 = time.perf_counter()
+        res = api_call(get_client().search, q=query, type="track", limit=1)
+        tracks = res.get("tracks", {}).get("items", [])
+        if not tracks:
+            return None
+        track = {"uri": tracks[0]["uri"], "name": tracks[0]["name"], "artist": tracks[0]["artists"][0]["name"]}
+        _TRACKS.put(query, **track, search_ms=(time.perf_counter() - t0) * 1000)
+    return {k: track.get(k) for k in ("uri", "name", "artist")}
+
+def play_song(query: str, prefer_device: str | None = None):
+    if not (query or "").strip():
+        return {"ok": False, "error": "Uso: play <canción> [prefer]"}
+    try:
+        track = resolve_track(query)
+        if track is None:
+            return {"ok": False, "error": f"No se encontró la canción: '{query}'"}
+
+        uri = track["uri"]
+        dev, _ = on_device(prefer_device, lambda device_id: api_call(get_client().start_playback, device_id=device_id, uris=[uri]))
+        if not dev.get("ok"):
+            return dev
+        device_id = dev["device_id"]
+        return {"ok": True, "message": f"Reproduciendo: {track['name']} · {track['artist']}", "track_uri": uri, "device_id": device_id}
+    except SpotifyException as e:
+        return {"ok": False, "error": f"Spotify API error: {e}"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+def split_songs(text: str) -> list:
+    """'a; b | c' -> ['a', 'b', 'c'] (separadores: ';', '|' o salto de línea)."""
+    return [p.strip() for p in re.split(r"[;|\n]", text or "") if p.strip()]
+
+def _resolve_one(query: str) -> dict:
+    t0 = time.perf_counter()
+    try:
+        track = resolve_track(query)
+        error = None if track else "No encontrada"
+    except SpotifyException as e:
+        track, error = None, f"Spotify API error: {e}"
+    except Exception as e:
+        track, error = None, str(e)
+    out = {"query": query, "ok": track is not None, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+    out.update(track or {"error": error})
+    return out
+
+def queue_songs(songs: str, modo: str = "reproduce"):
+    """
+    Resuelve varias canciones a la vez (pool acotado de hilos, con la caché de
+    canciones) y las manda en bloque: modo "reproduce" = un único
+    start_playback(uris=[...]) que sustituye lo que suena; modo "añade" =
+    add_to_queue de cada una tras lo actual. Devuelve el resultado por canción.
+    """
+    queries = split_songs(songs)
+    if not queries:
+        return {"ok": False, "error": "Uso: cola <canción1>; <canción2>; ..."}
+    if len(queries) > COLA_MAX:
+        return {"ok": False, "error": f"Como mucho {COLA_MAX} canciones por cola ({len(queries)} pedidas)."}
+    append = (modo or "").lower() in ("añade", "anade", "add")
+    try:
+        get_client()  # una sola vez, antes de repartir entre hilos
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(COLA_WORKERS, len(queries)))) as pool:
+            tracks = list(pool.map(_resolve_one, queries))
+        resolve_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+        uris = [t["uri"] for t in tracks if t["ok"]]
+        if not uris:
+            return {"ok": False, "error": "No se encontró ninguna de las canciones.", "tracks": tracks}
+
+        if append:
+            def send(device_id):
+                for uri in uris:
+                    api_call(get_client().add_to_queue, uri, device_id=device_id)
+        else:
+            send = lambda device_id: api_call(get_client().start_playback, device_id=device_id, uris=uris)
+        dev, _ = on_device(None, send)
+        if not dev.get("ok"):
+            dev["tracks"] = tracks
+            return dev
+        verb = "Añadidas a la cola" if append else "Reproduciendo"
+        return {"ok": True, "message": f"{verb} {len(uris)} de {len(queries)} canciones",
+                "tracks": tracks, "resolve_ms": resolve_ms, "device_id": dev["device_id"]}
+    except SpotifyException as e:
+        return {"ok": False, "error": f"Spotify API error: {e}"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+# ====== pause / next ======
+# Varias órdenes "next"/"pause" seguidas de un mismo payload llegan ya juntas
+# desde el Bridge ("coalesce" en Orders.json). Entre entradas distintas las
+# junta el worker residente: un next/pause que llega antes de COALESCE_S desde
+# el último ejecutado queda pendiente COALESCE_S y se le suman los iguales que
+# lleguen mientras tanto (N next -> un salto de N, varios pause -> uno). Se
+# responde sin esperar; si la ejecución diferida falla, el error sale con la
+# siguiente respuesta ("previous_error"). Cualquier otra orden ejecuta antes
+# lo pendiente, para no cambiar el orden.
+_CONTROL_LOCK = threading.RLock()
+_CONTROL = {"pending": None, "timer": None, "last": 0.0, "failed": None}
+
+def _skip(device_id: str, n: int):
+    """
+    Salta n canciones. Con un contexto sonando (álbum, playlist...) y n > 1,
+    salta de una vez a la n-ésima de la cola con start_playback + offset; si
+    no hay contexto o la API rechaza el offset, n next_track. (Con el offset,
+    las canciones de la cola del usuario que se saltan siguen en la cola.)
+    """
+    sp = get_client()
+    if n > 1:
+        context = ((api_call(sp.current_playback) or {}).get("context") or {}).get("uri")
+        upcoming = ((api_call(sp.queue) or {}).get("queue") or []) if context else []
+        if len(upcoming) >= n:
+            try:
+                api_call(sp.start_playback, device_id=device_id, context_uri=context,
+                         offset={"uri": upcoming[n - 1]["uri"]})
+                return
+            except SpotifyException as e:
+                if getattr(e, "http_status", None) == 429 or is_device_error(e):
+                    raise
+                # p.ej. la n-ésima venía de la cola del usuario, fuera del contexto
+    for _ in range(n):
+        api_call(sp.next_track, device_id=device_id)
+
+def _control(action: str, prefer_device: str | None, n: int = 1):
+    try:
+        if action == "next":
+            dev, _ = on_device(prefer_device, lambda device_id: _skip(device_id, n))
+        else:
+            dev, _ = on_device(prefer_device, lambda device_id: api_call(get_client().pause_playback, device_id=device_id))
+        if not dev.get("ok"):
+            return dev
+        message = "Siguiente" if action == "next" else "Pausado"
+        res = {"ok": True, "message": message, "device_id": dev["device_id"]}
+        if n > 1:
+            res["message"] = f"{message} (x{n})" if action == "next" else f"{message} ({n} órdenes agrupadas)"
+            res["coalesced"] = n
+        return res
+    except SpotifyException as e:
+        if getattr(e, "http_status", None) == 429:
+            return {"ok": False, "error": "Spotify está limitando las peticiones; prueba en unos segundos.",
+                    "retry_after": _retry_after(e)}
+        return {"ok": False, "error": f"Spotify API error: {e}"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+def flush_control():
+    """Ejecuta ya el next/pause pendiente, si lo hay."""
+    with _CONTROL_LOCK:
+        pending, _CONTROL["pending"] = _CONTROL["pending"], None
+        if _CONTROL["timer"] is not None:
+            _CONTROL["timer"].cancel()
+            _CONTROL["timer"] = None
+        if pending is None:
+            return
+        res = _control(pending["action"], pending["prefer"], pending["n"])
+        _CONTROL["last"] = time.monotonic()
+        if not res.get("ok"):
+            _CONTROL["failed"] = res
+
+def _flush_due(pending: dict):
+    """Fin de la ventana de `pending` (si no lo ha ejecutado ya otra orden)."""
+    with _CONTROL_LOCK:
+        if _CONTROL["pending"] is pending:
+            flush_control()
+
+def _take_failed_control():
+    with _CONTROL_LOCK:
+        failed, _CONTROL["failed"] = _CONTROL["failed"], None
+        return failed
+
+def _submit_control(action: str, prefer_device: str | None, n: int = 1):
+    if not RESIDENT or COALESCE_S <= 0:  # proceso de un solo uso: no hay después
+        return _control(action, prefer_device, n)
+    key = (action, (prefer_device or "").lower())
+    with _CONTROL_LOCK:
+        pending = _CONTROL["pending"]
+        if pending is not None and pending["key"] != key:
+            flush_control()
+            pending = None
+        if pending is None and time.monotonic() - _CONTROL["last"] >= COALESCE_S:
+            res = _control(action, prefer_device, n)
+            _CONTROL["last"] = time.monotonic()
+            return res
+        if pending is None:
+            pending = _CONTROL["pending"] = {"key": key, "action": action, "prefer": prefer_device, "n": 0}
+            timer = _CONTROL["timer"] = threading.Timer(COALESCE_S, _flush_due, args=(pending,))
+            timer.daemon = True
+            timer.start()
+        pending["n"] += n
+        total = pending["n"]
+    message = f"Siguiente (x{total}, agrupando)" if action == "next" else "Pausando"
+    return {"ok": True, "message": message, "pending": True, "coalesced": total}
+
+atexit.register(flush_control)
+
+def pause_song(prefer_device: str | None = None):
+    return _submit_control("pause", prefer_device)
+
+def next_song(prefer_device: str | None = None, veces=1):
+    try:
+        n = int(veces)
+    except (TypeError, ValueError):
+        return {"ok": False, "error": f"veces debe ser un número: {veces!r}"}
+    if not 1 <= n <= NEXT_MAX:
+        return {"ok": False, "error": f"veces debe estar entre 1 y {NEXT_MAX}"}
+    return _submit_control("next", prefer_device, n)
+
+def change_device(prefer: str):
+    # prefer puede ser "computer", "smartphone" o parte del nombre del dispositivo
+    if not (prefer or "").strip():
+        return {"ok": False, "error": "Uso: device <computer|smartphone|nombre>"}
+    try:
+        dev = ensure_active_device(prefer)
+        if not dev.get("ok"):
+            return dev
+        # Si ya está activo, simplemente lo reporta
+        return {"ok": True, "message": f"Dispositivo activo: {dev['device_name']} ({dev['device_type']})", "device_id": dev["device_id"]}
+    except SpotifyException as e:
+        return {"ok": False, "error": f"Spotify API error: {e}"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+def track_cache(action: str | None = None):
+    """Estadísticas de la caché de canciones; "limpia" la vacía."""
+    if action and action.lower() in ("limpia", "clear"):
+        _TRACKS.clear()
+        return {"ok": True, "message": "Caché de canciones vaciada"}
+    stats = _TRACKS.summary()
+    return {"ok": True, "message": f"{stats['entries']} canciones, {int(stats['hit_rate'] * 100)}% aciertos, "
+                                   f"~{stats['saved_ms']} ms ahorrados", "stats": stats}
+
+# ====== CLI ======
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 2:
+        sys.exit(jprint({"ok": False, "error": "Uso: python spotify_cli.py [devices | device <computer|smartphone|nombre> | play <canción> [prefer] | pause [prefer] | next [prefer] [--veces=N] | cola|encola <canción1>; <canción2>... | cache [limpia]]"}))
+
+    cmd = argv[1].lower()
+    if cmd not in ("next", "pause"):
+        flush_control()  # lo pendiente va antes que esta orden
+    # flags --clave=valor (options de Orders.json) fuera de los argumentos posicionales
+    flags = dict(a[2:].split("=", 1) for a in argv[2:] if a.startswith("--") and "=" in a)
+    words = [a for a in argv[2:] if not (a.startswith("--") and "=" in a)]
+
+    if cmd == "devices":
+        sys.exit(jprint(list_devices()))
+
+    elif cmd == "device":
+        if len(argv) < 3:
+            sys.exit(jprint({"ok": False, "error": "Uso: device <computer|smartphone|nombre>"}))
+        prefer = argv[2]
+        sys.exit(jprint(change_device(prefer)))
+
+    elif cmd == "play":
+        if len(argv) < 3:
+            sys.exit(jprint({"ok": False, "error": "Uso: play <canción> [prefer]"}))
+        song = argv[2]
+        prefer = argv[3].lower() if len(argv) >= 4 else None
+        sys.exit(jprint(play_song(song, prefer)))
+
+    elif cmd == "pause":
+        prefer = argv[2].lower() if len(argv) >= 3 else None
+        sys.exit(jprint(pause_song(prefer)))
+
+    elif cmd == "next":
+        prefer = words[0].lower() if words else None
+        sys.exit(jprint(next_song(prefer, flags.get("veces", 1))))
+
+    elif cmd in ("cola", "encola"):
+        sys.exit(jprint(queue_songs(" ".join(words), flags.get("modo", "añade" if cmd == "encola" else "reproduce"))))
+
+    elif cmd == "cache":
+        sys.exit(jprint(track_cache(argv[2] if len(argv) >= 3 else None)))
+
+    else:
+        sys.exit(jprint({"ok": False, "error": "Comando no reconocido. Usa: devices | device | play | pause | next | cola | encola | cache"}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Cliente falso de spotipy para probar Spotify.py sin red ni cuenta.
+
+Se activa con ALFRED_SPOTIFY_FAKE=1; Spotify.py lo usa en lugar de
+spotipy.Spotify y guarda sus cachés en una carpeta temporal en vez de
+Core/State. Responde de forma determinista:
+  - search(): una canción por consulta (uri derivada del texto); las
+    consultas que contienen "noexiste" no devuelven nada.
+  - devices(): un ordenador y un móvil; transfer_playback() cambia el activo.
+  - start_playback / add_to_queue / pause / next: se anotan en `calls` y en
+    el estado de reproducción (`context`, `playing`, `pos`, `user_queue`);
+    queue() y current_playback() lo devuelven como la API real (los usa el
+    salto de varias canciones de un "next").
+  - start_playback(context_uri=...): cualquier contexto tiene CONTEXT_LEN
+    canciones; un offset fuera de él responde 400 como la API.
+ALFRED_SPOTIFY_FAKE_LATENCY_MS simula la latencia de cada llamada (def. 80).
+ALFRED_SPOTIFY_FAKE_429_EVERY=N responde 429 (Retry-After: 1) a una de cada N
+llamadas (def. 0 = nunca).
+
+  ALFRED_SPOTIFY_FAKE=1 python Core/Orders/Spotify.py cola "song 2; noexiste; around the world"
+
+`python Core/Orders/SpotifyFake.py check` pasa queue_songs (modos "reproduce"
+y "añade") y next por este cliente y comprueba lo que llega a la "API". El
+paralelismo se mide con `peak`, las llamadas en curso a la vez, no con relojes.
+"""
+import os, sys, time, hashlib, threading, importlib.util
+from spotipy.exceptions import SpotifyException
+
+LATENCY_S = float(os.environ.get("ALFRED_SPOTIFY_FAKE_LATENCY_MS", "80")) / 1000
+RATE_LIMIT_EVERY = int(os.environ.get("ALFRED_SPOTIFY_FAKE_429_EVERY", "0"))
+CONTEXT_LEN = 20
+
+
+class FakeSpotify:
+    def __init__(self, latency_s: float = LATENCY_S, rate_limit_every: int = RATE_LIMIT_EVERY):
+        self.latency_s = latency_s
+        self.rate_limit_every = rate_limit_every
+        self.calls: list = []
+        self.in_flight = 0
+        self.peak = 0           # máximo de llamadas en curso a la vez
+        self.active = None
+        self.context = None
+        self.playing: list = []
+        self.pos = 0
+        self.user_queue: list = []
+        self._devices = [
+            {"id": "fake-pc", "name": "Fake PC", "type": "Computer", "volume_percent": 60},
+            {"id": "fake-phone", "name": "Fake Phone", "type": "Smartphone", "volume_percent": 40},
+        ]
+        self._lock = threading.Lock()
+
+    def _call(self, name: str, *args):
+        with self._lock:
+            self.calls.append((name,) + args)
+            limited = self.rate_limit_every and len(self.calls) % self.rate_limit_every == 0
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if limited:
+            raise SpotifyException(429, -1, "API rate limit exceeded", headers={"Retry-After": "1"})
+
+    def _check_device(self, device_id):
+        if device_id is not None and device_id not in {d["id"] for d in self._devices}:
+            raise SpotifyException(404, -1, "Device not found", reason="NO_ACTIVE_DEVICE")
+
+    def search(self, q, type="track", limit=10, **kwargs):
+        self._call("search", q)
+        if not q.strip() or "noexiste" in q.lower():
+            return {"tracks": {"items": []}}
+        track_id = hashlib.sha1(q.strip().lower().encode("utf-8")).hexdigest()[:22]
+        return {"tracks": {"items": [{
+            "uri": f"spotify:track:{track_id}",
+            "name": q.strip().title(),
+            "artists": [{"name": "Fake Artist"}],
+        }]}}
+
+    def devices(self):
+        self._call("devices")
+        return {"devices": [dict(d, is_active=d["id"] == self.active) for d in self._devices]}
+
+    def transfer_playback(self, device_id, force_play=True):
+        self._call("transfer_playback", device_id)
+        self._check_device(device_id)
+        self.active = device_id
+
+    @staticmethod
+    def context_tracks(context_uri: str) -> list:
+        return [f"spotify:track:{hashlib.sha1(f'{context_uri}#{i}'.encode()).hexdigest()[:22]}"
+                for i in range(CONTEXT_LEN)]
+
+    def start_playback(self, device_id=None, context_uri=None, uris=None, offset=None, **kwargs):
+        self._call("start_playback", device_id, context_uri or tuple(uris or ()), offset)
+        self._check_device(device_id)
+        if context_uri:
+            tracks = self.context_tracks(context_uri)
+            pos = (offset or {}).get("position", 0)
+            if "uri" in (offset or {}):
+                if offset["uri"] not in tracks:
+                    raise SpotifyException(400, -1, "Invalid offset")
+                pos = tracks.index(offset["uri"])
+            self.context, self.playing, self.pos = context_uri, tracks, pos  # la cola del usuario sigue
+        else:
+            self.context, self.playing, self.pos, self.user_queue = None, list(uris or []), 0, []
+
+    def add_to_queue(self, uri, device_id=None):
+        self._call("add_to_queue", uri, device_id)
+        self._check_device(device_id)
+        self.user_queue.append(uri)
+
+    def queue(self):
+        self._call("queue")
+        upcoming = self.user_queue + self.playing[self.pos + 1:]
+        current = self.playing[self.pos] if self.pos < len(self.playing) else None
+        return {"currently_playing": current and {"uri": current}, "queue": [{"uri": u} for u in upcoming]}
+
+    def current_playback(self):
+        self._call("current_playback")
+        if self.pos >= len(self.playing):
+            return None
+        context = {"uri": self.context} if self.context else None
+        return {"context": context, "item": {"uri": self.playing[self.pos]}, "is_playing": True}
+
+    def pause_playback(self, device_id=None):
+        self._call("pause_playback", device_id)
+        self._check_device(device_id)
+
+    def next_track(self, device_id=None):
+        self._call("next_track", device_id)
+        self._check_device(device_id)
+        if self.user_queue:
+            self.playing.insert(self.pos + 1, self.user_queue.pop(0))
+        self.pos += 1
+
+
+def _load_spotify():
+    """Importa Spotify.py en modo falso (sin red, cachés en una carpeta temporal)."""
+    os.environ["ALFRED_SPOTIFY_FAKE"] = "1"
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Spotify.py")
+    spec = importlib.util.spec_from_file_location("Spotify", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def check():
+    spotify = _load_spotify()
+    sp = spotify.get_client()
+    sp.rate_limit_every = 0  # los reintentos tras un 429 repetirían llamadas en `calls`
+    sp.latency_s = sp.latency_s or 0.05  # sin latencia las búsquedas apenas se solapan
+    spotify.COALESCE_S = 0   # cada next se ejecuta al momento
+    queries = ["song 2", "noexiste", "around the world", "one more time"]
+    failures = []
+
+    def expect(cond, what):
+        print(f"  {'ok ' if cond else 'MAL'} {what}")
+        if not cond:
+            failures.append(what)
+
+    for modo in ("reproduce", "añade"):
+        print(f"queue_songs modo={modo}")
+        spotify.track_cache("limpia")
+        sp.calls.clear()
+        sp.peak = 0
+        res = spotify.queue_songs("; ".join(queries), modo)
+        tracks = res.get("tracks") or []
+        found = [t["uri"] for t in tracks if t["ok"]]
+        sent = [c for c in sp.calls if c[0] in ("start_playback", "add_to_queue")]
+        expect(res.get("ok"), "la orden termina bien")
+        expect([t["query"] for t in tracks] == queries, "un resultado por canción, en orden")
+        expect([t["ok"] for t in tracks] == [q != "noexiste" for q in queries], '"noexiste" falla y el resto no')
+        expect(sum(c[0] == "search" for c in sp.calls) == len(queries), "una búsqueda por canción")
+        expect(sp.peak > 1, f"búsquedas en paralelo ({sp.peak} a la vez)")
+        if modo == "reproduce":
+            expect([c[2] for c in sent] == [tuple(found)], "un único start_playback con todas las uris")
+            expect(sp.playing == found, "suenan las canciones encontradas")
+        else:
+            expect([c[1] for c in sent] == found and all(c[0] == "add_to_queue" for c in sent),
+                   "un add_to_queue por canción, en orden")
+            expect(sp.user_queue[-len(found):] == found, "quedan en la cola tras lo actual")
+
+    print("next veces=3")
+    context = "spotify:playlist:fake"
+    for with_context in (True, False):
+        sp.user_queue.clear()  # lo que dejó "añade" no es del contexto: forzaría el plan B
+        if with_context:
+            sp.start_playback(context_uri=context)
+        else:
+            sp.start_playback(uris=sp.context_tracks(context))
+        sp.calls.clear()
+        res = spotify.next_song(None, 3)
+        names = [c[0] for c in sp.calls]
+        where = "con contexto" if with_context else "sin contexto"
+        expect(res.get("ok") and sp.pos == 3, f"{where}: avanza 3 canciones")
+        if with_context:
+            expect("next_track" not in names and names.count("start_playback") == 1 and sp.context == context,
+                   f"{where}: un start_playback con offset, sin perder el contexto")
+        else:
+            expect(names.count("next_track") == 3, f"{where}: tres next_track")
+
+    print("OK" if not failures else f"{len(failures)} comprobaciones fallidas")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "check":
+        sys.exit(check())
+    print("Uso: python SpotifyFake.py check")
@@ -0,0 +1,288 @@
+"""
+Recorrido paralelo de directorios con os.scandir para Files.py.
+
+Cada hilo tiene su propia cola de carpetas (deque): saca de su extremo derecho
+(en profundidad, buena localidad) y, cuando se queda sin trabajo, roba del
+extremo izquierdo de otro hilo (las carpetas más altas, que suelen tener más
+trabajo debajo). Se para en cuanto hay `max_matches` coincidencias o se activa
+`cancel`.
+
+walk_ranked recorre varias raíces con una cola de prioridad compartida: siempre
+se expande la carpeta más prometedora y cada coincidencia se entrega al momento.
+
+Benchmark contra os.walk en un árbol sintético:
+  python Core/Orders/Walker.py bench [n_archivos=1000000] [carpeta]
+"""
+import os, sys, time, heapq, itertools, tempfile, threading
+from collections import deque
+
+WORKERS = int(os.environ.get("ALFRED_WALK_WORKERS", "8"))
+
+
+class _Walk:
+    def __init__(self, match, skip_re, workers: int, max_depth, max_matches, cancel, progress):
+        self.match = match
+        self.skip_re = skip_re
+        self.max_depth = max_depth
+        self.max_matches = max_matches
+        self.cancel = cancel
+        self.progress = progress
+        self.deques = [deque() for _ in range(workers)]
+        self.cv = threading.Condition()
+        self.pending = 0          # carpetas encoladas o en proceso
+        self.scanned = 0
+        self.matches: list[str] = []
+        self._lock = threading.Lock()
+
+    def _push(self, i: int, items: list):
+        # pending sube antes de publicar: nadie puede ver pending == 0 con trabajo en cola
+        with self.cv:
+            self.pending += len(items)
+        self.deques[i].extend(items)
+        with self.cv:
+            self.cv.notify(len(items))
+
+    def _take(self, i: int):
+        try:
+            return self.deques[i].pop()
+        except IndexError:
+            pass
+        n = len(self.deques)
+        for k in range(1, n):
+            try:
+                return self.deques[(i + k) % n].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _scan(self, i: int, path: str, depth: int):
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return
+        subdirs = []
+        descend = self.max_depth is None or depth < self.max_depth
+        for e in entries:
+            try:
+                is_dir = e.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if descend and not e.is_symlink() and not (self.skip_re and self.skip_re.search(e.path)):
+                    subdirs.append((e.path, depth + 1))
+            elif self.match(e.name):
+                with self._lock:
+                    self.matches.append(e.path)
+                    if self.max_matches and len(self.matches) >= self.max_matches:
+                        self.cancel.set()
+                        return
+        if subdirs:
+            self._push(i, subdirs)
+        if self.progress:
+            with self._lock:
+                self.scanned += 1
+                count = self.scanned
+            self.progress(count, path)
+
+    def _worker(self, i: int):
+        while not self.cancel.is_set():
+            item = self._take(i)
+            if item is None:
+                with self.cv:
+                    if self.pending == 0:
+                        return
+                    self.cv.wait(0.05)
+                continue
+            try:
+                self._scan(i, *item)
+            finally:
+                with self.cv:
+                    self.pending -= 1
+                    if self.pending == 0:
+                        self.cv.notify_all()
+        with self.cv:
+            self.cv.notify_all()
+
+    def run(self, root: str) -> list:
+        self._push(0, [(root, 0)])
+        threads = [threading.Thread(target=self._worker, args=(i,), daemon=True)
+                   for i in range(len(self.deques))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.matches
+
+
+def walk_find(root: str, match, skip_re=None, workers: int = WORKERS, max_depth: int | None = None,
+              max_matches: int | None = 1, cancel: threading.Event | None = None, progress=None) -> list:
+    """
+    Rutas de archivos bajo `root` cuyo nombre cumple `match(nombre)`.
+    - skip_re: regex sobre la ruta completa de las carpetas que no se recorren.
+    - max_depth: profundidad máxima (0 = solo `root`); None = sin límite.
+    - max_matches: para al llegar a tantas coincidencias (None = todas).
+    - cancel: Event para abortar desde fuera (también lo activa max_matches).
+    - progress(carpetas_revisadas, ruta): se llama desde los hilos del recorrido.
+    Sin orden garantizado entre coincidencias.
+    """
+    if isinstance(match, str):
+        name = match.lower()
+        match = lambda n: n.lower() == name
+    walk = _Walk(match, skip_re, max(1, workers), max_depth, max_matches,
+                 cancel or threading.Event(), progress)
+    return walk.run(root)
+
+
+class _RankedWalk:
+    """Montón compartido (prioridad de carpeta) en lugar de colas por hilo."""
+
+    def __init__(self, match, skip_re, workers: int, priority, on_match, max_matches, cancel):
+        self.match = match
+        self.skip_re = skip_re
+        self.workers = workers
+        self.priority = priority
+        self.on_match = on_match
+        self.max_matches = max_matches
+        self.cancel = cancel
+        self.cv = threading.Condition()
+        self.heap: list = []
+        self.seq = itertools.count()
+        self.seen: set = set()
+        self.pending = 0
+        self.found = 0
+
+    def _push(self, items: list):
+        with self.cv:
+            for path, depth in items:
+                key = os.path.normcase(path)
+                if key in self.seen:  # raíces solapadas
+                    continue
+                self.seen.add(key)
+                heapq.heappush(self.heap, (-self.priority(path, depth), next(self.seq), path, depth))
+                self.pending += 1
+            self.cv.notify_all()
+
+    def _scan(self, path: str, depth: int, prio: float):
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return
+        subdirs = []
+        for e in entries:
+            try:
+                is_dir = e.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not e.is_symlink() and not (self.skip_re and self.skip_re.search(e.path)):
+                    subdirs.append((e.path, depth + 1))
+                continue
+            score = self.match(e.name)
+            if score is None:
+                continue
+            self.on_match(e.path, score, prio)
+            with self.cv:
+                self.found += 1
+                if self.max_matches and self.found >= self.max_matches:
+                    self.cancel.set()
+            if self.cancel.is_set():
+                return
+        if subdirs:
+            self._push(subdirs)
+
+    def _worker(self):
+        while not self.cancel.is_set():
+            with self.cv:
+                while not self.heap and self.pending and not self.cancel.is_set():
+                    self.cv.wait(0.05)
+                if not self.heap:
+                    self.cv.notify_all()
+                    return
+                neg, _, path, depth = heapq.heappop(self.heap)
+            try:
+                self._scan(path, depth, -neg)
+            finally:
+                with self.cv:
+                    self.pending -= 1
+                    if not self.pending:
+                        self.cv.notify_all()
+
+    def run(self, roots: list):
+        self._push([(r, 0) for r in roots])
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.found
+
+
+def walk_ranked(roots: list, match, priority, on_match, skip_re=None, workers: int = WORKERS,
+                max_matches: int | None = None, cancel: threading.Event | None = None) -> int:
+    """
+    Recorre `roots` por orden de prioridad y llama on_match(ruta, puntuación, prioridad_carpeta)
+    por cada archivo cuyo match(nombre) no sea None (desde los hilos del recorrido).
+    - priority(ruta_carpeta, profundidad) -> float: mayor = antes.
+    - max_matches / cancel: como en walk_find.
+    Devuelve el número de coincidencias entregadas.
+    """
+    walk = _RankedWalk(match, skip_re, max(1, workers), priority, on_match, max_matches,
+                       cancel or threading.Event())
+    return walk.run(roots)
+
+
+# ---------- benchmark ----------
+def _make_tree(base: str, n_files: int, per_dir: int = 100, fanout: int = 10):
+    """Árbol sintético con n_files archivos vacíos repartidos en carpetas de per_dir."""
+    n_dirs = max(1, n_files // per_dir)
+    made = 0
+    for d in range(n_dirs):
+        parts, x = [], d
+        while True:
+            parts.append(f"d{x % fanout}")
+            x //= fanout
+            if not x:
+                break
+        path = os.path.join(base, *reversed(parts), f"leaf{d}")
+        os.makedirs(path, exist_ok=True)
+        for f in range(min(per_dir, n_files - made)):
+            open(os.path.join(path, f"f{d}_{f}.dat"), "wb").close()
+        made += per_dir
+    return n_dirs
+
+
+def _bench(n_files: int, base: str):
+    marker = os.path.join(base, ".tree_ok")
+    if not os.path.exists(marker) or open(marker).read() != str(n_files):
+        print(f"Creando árbol sintético de {n_files} archivos en {base}...")
+        _make_tree(base, n_files)
+        with open(marker, "w") as f:
+            f.write(str(n_files))
+
+    def os_walk_find(name):
+        for dirpath, dirs, files in os.walk(base):
+            for f in files:
+                if f.lower() == name:
+                    return [os.path.join(dirpath, f)]
+        return []
+
+    last = f"f{n_files // 100 - 1}_0.dat"
+    for label, name in (("acierto", last), ("fallo", "no_existe.dat")):
+        t0 = time.perf_counter()
+        a = os_walk_find(name)
+        t1 = time.perf_counter()
+        b = walk_find(base, name)
+        t2 = time.perf_counter()
+        print(f"{label:8} os.walk {t1 - t0:7.2f}s  walk_find({WORKERS} hilos) {t2 - t1:7.2f}s  "
+              f"x{(t1 - t0) / max(t2 - t1, 1e-9):.1f}  ({len(a)}/{len(b)} resultados)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        n = int(sys.argv[2]) if len(sys.argv) >= 3 else 1_000_000
+        base = sys.argv[3] if len(sys.argv) >= 4 else os.path.join(tempfile.gettempdir(), "alfred_walk_bench")
+        _bench(n, base)
+    else:
+        print("Uso: python Walker.py bench [n_archivos] [carpeta]")
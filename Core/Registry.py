@@ -0,0 +1,90 @@
+# registry.py
+import json, os, threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent
+ORDERS_JSON = ROOT / "Orders.json"
+
+# Firma parseada: [(nombre, tipo)] con tipo None = literal, True = <obligatorio>, False = [opcional]
+Signature = List[Tuple[str, Optional[bool]]]
+
+
+def split_param_name(x: str) -> Tuple[str, Optional[bool]]:
+    """
+    Devuelve (nombre, es_obligatorio).
+    - '<cancion>'  -> ('cancion', True)
+    - '[device]'   -> ('device',  False)
+    - literales    -> (literal, None)  # para el trigger del comando
+    """
+    x = x.strip()
+    if x.startswith("<") and x.endswith(">"):
+        return x[1:-1].strip(), True
+    if x.startswith("[") and x.endswith("]"):
+        return x[1:-1].strip(), False
+    return x, None  # literal
+
+
+class OrdersRegistry:
+    """
+    Orders.json compartido por todo el proceso.
+    Se parsea una vez y solo se recarga si cambia el mtime del fichero.
+    Precalcula:
+      - commands:   (domain, literal) -> (cmd_name, firma parseada)
+      - signatures: (domain, cmd_name) -> firma parseada
+    """
+
+    def __init__(self, path: Path = ORDERS_JSON):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime: int | None = None
+        self.spec: Dict = {}
+        self.commands: Dict[Tuple[str, str], Tuple[str, Signature]] = {}
+        self.signatures: Dict[Tuple[str, str], Signature] = {}
+
+    def _build(self, spec: Dict):
+        commands, signatures = {}, {}
+        for domain, dom in spec.items():
+            if not isinstance(dom, dict):
+                continue
+            for cmd_name, cmd_spec in (dom.get("commands") or {}).items():
+                sig = [split_param_name(x) for x in (cmd_spec.get("args") or [])]
+                signatures[(domain, cmd_name)] = sig
+                # El primer elemento de la firma debe ser el literal del comando
+                if sig and sig[0][1] is None:
+                    commands.setdefault((domain.lower(), sig[0][0].lower()), (cmd_name, sig))
+        return commands, signatures
+
+    def load(self) -> Dict:
+        """
+        Devuelve el spec vigente, recargando si cambió el mtime.
+        Si la recarga falla se conserva el último spec válido; si nunca hubo uno, lanza.
+        """
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return self.spec
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        spec = json.load(f)
+                except Exception:
+                    if self._mtime is None:
+                        raise
+                    return self.spec
+                self.commands, self.signatures = self._build(spec)
+                self.spec = spec
+                self._mtime = mtime
+        return self.spec
+
+    def lookup(self, domain: str, literal: str) -> Optional[Tuple[str, Signature]]:
+        """(cmd_name, firma) para '<domain> <literal>' o None."""
+        self.load()
+        return self.commands.get((domain.lower(), literal.lower()))
+
+    def signature(self, domain: str, command: str) -> Optional[Signature]:
+        self.load()
+        return self.signatures.get((domain, command))
+
+
+REGISTRY = OrdersRegistry()
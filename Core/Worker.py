@@ -0,0 +1,301 @@
+# worker.py
+"""
+Proceso residente para un dominio de Orders.
+
+Importa el script UNA vez (spotipy, playwright, auth...) y atiende peticiones
+JSON-lines por stdin, respondiendo una línea JSON por stdout:
+  {"id": 1, "argv": ["busca", "gatos"]}  -> {"id": 1, "stdout": "...", "stderr": "...", "returncode": 0}
+  {"id": 2, "op": "ping"}                -> {"id": 2, "ok": true, "pong": true}
+Mientras el script corre, sus eventos de progreso (ver parse_event) se
+reenvían al momento como {"id": 1, "event": {...}}.
+Al arrancar emite {"ready": true} (o {"ready": false, "error": ...}).
+Termina con EOF en stdin o tras IDLE_TIMEOUT segundos sin peticiones.
+
+Uso: python Core/Worker.py <ruta_script> [idle_timeout]
+
+El lado cliente (WorkerClient / WorkerPool) lo usa Core/Dispatcher.py.
+"""
+import sys, os, io, json, time, queue, threading, subprocess, traceback, importlib.util
+from contextlib import redirect_stdout, redirect_stderr
+
+IDLE_TIMEOUT = 300.0     # el worker sale solo tras este tiempo sin peticiones
+READY_TIMEOUT = 30.0     # import de playwright/spotipy + auth
+HEALTH_AFTER = 30.0      # ping antes de reutilizar un worker ocioso más de esto
+BROKEN_BACKOFF = 60.0    # tras fallar el arranque, no reintentar durante este tiempo
+
+
+def load_script(path: str):
+    name = "alfred_order_" + os.path.splitext(os.path.basename(path))[0].lower()
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not callable(getattr(module, "main", None)):
+        raise RuntimeError(f"{path} no define main(argv)")
+    return module
+
+
+# ====== Protocolo de eventos de los scripts de Orders ======
+# Un script puede escribir por stdout, una por línea:
+#   {"event": "progress", "message": "...", ...}   avance
+#   {"event": "partial", "data": {...}}            resultado parcial
+#   {"event": "result", "result": {...}}           resultado final
+# Si no emite "result", el resultado es el objeto JSON habitual (parseo relajado).
+EVENT_TYPES = ("progress", "partial", "result")
+
+
+def parse_event(line: str) -> dict | None:
+    """Devuelve el evento si la línea es un evento del protocolo; si no, None."""
+    line = line.strip()
+    if not (line.startswith("{") and line.endswith("}") and '"event"' in line):
+        return None
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(obj, dict) and obj.get("event") in EVENT_TYPES:
+        return obj
+    return None
+
+
+class _EventTee(io.TextIOBase):
+    """stdout del script: reenvía al instante los eventos (salvo "result") y acumula el resto."""
+
+    def __init__(self, on_event=None):
+        self.on_event = on_event
+        self.other = io.StringIO()
+        self._buf = ""
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        self._buf += s
+        while "\n" in self._buf:
+            line, self._buf = self._buf.split("\n", 1)
+            evt = parse_event(line)
+            if evt is not None and evt["event"] != "result" and self.on_event:
+                self.on_event(evt)
+            else:
+                self.other.write(line + "\n")
+        return len(s)
+
+    def getvalue(self) -> str:
+        return self.other.getvalue() + self._buf
+
+
+def call_main(module, script: str, argv: list, on_event=None) -> dict:
+    """
+    Ejecuta module.main() como si fuera `python script argv...`, capturando salida y código.
+    Los eventos de progreso se pasan a on_event según se emiten.
+    """
+    out, err = _EventTee(on_event), io.StringIO()
+    code = 0
+    with redirect_stdout(out), redirect_stderr(err):
+        try:
+            rc = module.main([script] + list(argv))
+            code = rc if isinstance(rc, int) else 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+    return {"stdout": out.getvalue(), "stderr": err.getvalue(), "returncode": code}
+
+
+def _reader(q: queue.Queue):
+    for line in sys.stdin:
+        q.put(line)
+    q.put(None)  # EOF
+
+
+def serve(script: str, idle_timeout: float = IDLE_TIMEOUT):
+    proto = sys.stdout
+    # Cualquier print suelto (import incluido) va a stderr para no romper el protocolo
+    sys.stdout = sys.stderr
+
+    def send(obj: dict):
+        proto.write(json.dumps(obj) + "\n")
+        proto.flush()
+
+    try:
+        module = load_script(script)
+    except BaseException as e:  # incluye sys.exit() a nivel de módulo
+        send({"ready": False, "error": f"No se pudo importar {script}: {e!r}"})
+        return 1
+    send({"ready": True, "pid": os.getpid()})
+
+    q: queue.Queue = queue.Queue()
+    threading.Thread(target=_reader, args=(q,), daemon=True).start()
+    while True:
+        try:
+            line = q.get(timeout=idle_timeout)
+        except queue.Empty:
+            return 0  # ocioso demasiado tiempo
+        if line is None:
+            return 0
+        try:
+            req = json.loads(line)
+        except ValueError:
+            continue
+        rid = req.get("id")
+        if req.get("op") == "ping":
+            send({"id": rid, "ok": True, "pong": True})
+            continue
+        res = call_main(module, script, req.get("argv") or [],
+                        on_event=lambda evt, rid=rid: send({"id": rid, "event": evt}))
+        res["id"] = rid
+        send(res)
+
+
+# ====== Cliente (lado Dispatcher) ======
+_EOF = object()
+
+
+class WorkerClient:
+    """Un worker por script: arranque con handshake, petición/respuesta, ping y reinicio."""
+
+    def __init__(self, script: str, cwd: str, idle_timeout: float = IDLE_TIMEOUT):
+        self.script = script
+        self.cwd = cwd
+        self.idle_timeout = idle_timeout
+        self.proc: subprocess.Popen | None = None
+        self.lock = threading.Lock()
+        self.last_used = 0.0
+        self.broken_until = 0.0
+        self._q: queue.Queue | None = None
+        self._seq = 0
+
+    @staticmethod
+    def _pump(proc: subprocess.Popen, q: queue.Queue):
+        for raw in proc.stdout:
+            try:
+                q.put(json.loads(raw.decode("utf-8")))
+            except ValueError:
+                continue
+        q.put(_EOF)
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def close(self):
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()  # EOF -> el worker sale limpio
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+
+    def _start(self):
+        self.close()
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), self.script, str(self.idle_timeout)],
+            cwd=self.cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.proc, self._q = proc, queue.Queue()
+        threading.Thread(target=self._pump, args=(proc, self._q), daemon=True).start()
+        try:
+            msg = self._q.get(timeout=READY_TIMEOUT)
+        except queue.Empty:
+            msg = None
+        if not isinstance(msg, dict) or not msg.get("ready"):
+            err = msg.get("error") if isinstance(msg, dict) else "el worker no respondió al arrancar"
+            proc.kill()
+            self.proc = None
+            self.broken_until = time.monotonic() + BROKEN_BACKOFF
+            raise RuntimeError(err)
+        self.last_used = time.monotonic()
+
+    def _roundtrip(self, req: dict, timeout: float, on_event=None) -> dict:
+        self._seq += 1
+        req["id"] = self._seq
+        self.proc.stdin.write((json.dumps(req) + "\n").encode("utf-8"))
+        self.proc.stdin.flush()
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("timeout esperando al worker")
+            try:
+                msg = self._q.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError("timeout esperando al worker")
+            if msg is _EOF:
+                raise EOFError("el worker terminó inesperadamente")
+            if msg.get("id") != req["id"]:
+                continue
+            if "event" in msg:
+                if on_event:
+                    on_event(msg["event"])
+                continue
+            return msg
+
+    def ping(self, timeout: float = 2.0) -> bool:
+        try:
+            return bool(self._roundtrip({"op": "ping"}, timeout).get("pong"))
+        except Exception:
+            return False
+
+    def ensure(self):
+        """Arranca o reinicia si murió, si está a punto de caducar por inactividad o si no responde al ping."""
+        if time.monotonic() < self.broken_until:
+            raise RuntimeError("worker deshabilitado temporalmente tras un fallo de arranque")
+        idle = time.monotonic() - self.last_used
+        if not self.alive() or idle > self.idle_timeout * 0.9:
+            self._start()
+        elif idle > HEALTH_AFTER and not self.ping():
+            self._start()
+
+    def run(self, argv: list, timeout: float = 60, on_event=None) -> dict:
+        """
+        Devuelve {"stdout","stderr","returncode"} del script.
+        RuntimeError si no se pudo arrancar (el caller hace fallback a subprocess);
+        TimeoutError / EOFError si falló durante la petición (el worker se descarta).
+        """
+        with self.lock:
+            self.ensure()
+            try:
+                try:
+                    res = self._roundtrip({"argv": list(argv)}, timeout, on_event)
+                except (BrokenPipeError, ConnectionResetError):
+                    # tubería rota antes de entregar la petición: nada se ejecutó, reintenta una vez
+                    self._start()
+                    res = self._roundtrip({"argv": list(argv)}, timeout, on_event)
+            except (TimeoutError, EOFError, OSError):
+                self.close()
+                raise
+            self.last_used = time.monotonic()
+            return res
+
+
+class WorkerPool:
+    """Workers residentes indexados por script."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._workers: dict[str, WorkerClient] = {}
+
+    def get(self, script: str, cwd: str) -> WorkerClient:
+        with self._lock:
+            w = self._workers.get(script)
+            if w is None:
+                w = self._workers[script] = WorkerClient(script, cwd)
+            return w
+
+    def close_all(self):
+        with self._lock:
+            workers, self._workers = list(self._workers.values()), {}
+        for w in workers:
+            w.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("Uso: python Worker.py <ruta_script> [idle_timeout]\n")
+        sys.exit(2)
+    idle = float(sys.argv[2]) if len(sys.argv) >= 3 else IDLE_TIMEOUT
+    sys.exit(serve(os.path.abspath(sys.argv[1]), idle))
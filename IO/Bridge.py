@@ -1,52 +1,255 @@
-# bridge.py
-import json, sys
-from Core.Dispatcher import dispatch
-
-def _run_one(order: dict) -> dict:
-    """
-    Ejecuta una única orden del tipo:
-      {"domain":"chrome","command":"abre","args":{"url":"youtube.com"}}
-    """
-    domain  = order.get("domain")
-    command = order.get("command")
-    args    = order.get("args") or {}
-    if not domain or not command:
-        return {"ok": False, "error": "Faltan 'domain' o 'command' en la orden.", "order": order}
-    
-    result = dispatch(domain, command, **args)
-    return result
-
-def run_payload(payload: str) -> dict:
-    """
-    Acepta:
-      - Una orden: {"domain":..., "command":..., "args":{...}}
-      - Varias: {"orders":[ {...}, {...} ]}
-    Devuelve JSON con el resultado (ok True/False).
-    """
-    try:
-        data = json.loads(payload)
-    except Exception as e:
-        return {"ok": False, "error": f"JSON inválido: {e}", "raw": payload}
-
-    # Multi-órdenes
-    if isinstance(data, dict) and isinstance(data.get("orders"), list):
-        results = []
-        all_ok = True
-        for order in data["orders"]:
-            res = _run_one(order)
-            results.append(res)
-            all_ok = all_ok and bool(res.get("ok"))
-        return {"ok": all_ok, "results": results}
-
-    # Orden única
-    if isinstance(data, dict):
-        return _run_one(data)
-
-    return {"ok": False, "error": "Estructura no reconocida. Esperaba un objeto o {\"orders\":[...]}"}
-
-if __name__ == "__main__":
-    # Si hay argumento, úsalo; si no, lee desde STDIN
-    payload = sys.argv[1] if len(sys.argv) >= 2 else sys.stdin.read()
-    out = run_payload(payload.strip())
-    print(json.dumps(out, ensure_ascii=False))
+# bridge.py
+import json, sys, os, asyncio
+from collections import deque
+from Core.Dispatcher import dispatch_async
+from Core.Registry import REGISTRY
+
+# Máximo de órdenes ejecutándose a la vez en un payload multi-orden
+MAX_PARALLEL = int(os.environ.get("ALFRED_MAX_PARALLEL", "4"))
+
+async def _run_one(order: dict, on_event=None) -> dict:
+    """
+    Ejecuta una única orden del tipo:
+      {"domain":"chrome","command":"abre","args":{"url":"youtube.com"}, "timeout": 30}
+    ("timeout" opcional: deadline de la orden en segundos)
+    """
+    if not isinstance(order, dict):
+        return {"ok": False, "error": "La orden no es un objeto.", "order": order}
+    domain  = order.get("domain")
+    command = order.get("command")
+    args    = order.get("args") or {}
+    if not domain or not command:
+        return {"ok": False, "error": "Faltan 'domain' o 'command' en la orden.", "order": order}
+    
+    try:
+        result = await dispatch_async(domain, command, timeout=order.get("timeout"), on_event=on_event, **args)
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+    return result
+
+def _is_ref(value) -> bool:
+    """Un "id"/"after" válido: texto o entero (no listas/objetos que cuelen del LLM)."""
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+def _build_dag(orders: list, orders_spec: dict):
+    """
+    Dependencias de cada orden (índices). Fuentes:
+      - explícitas: "id" y "after" (id o lista de ids) en la propia orden;
+      - implícitas (Orders.json):
+          * dominio con "serial" (por defecto true): va después de la orden anterior
+            del mismo dominio (solo orden: se ejecuta aunque esa falle);
+          * comando con "after": ["dominio.comando", ...]: depende de la última orden
+            anterior que coincida con alguno de ellos.
+    Devuelve (deps, errors): deps[i] = {j: requiere_éxito}, errors = {i: motivo}.
+    """
+    ids: dict = {}
+    errors: dict[int, str] = {}
+    for i, order in enumerate(orders):
+        oid = order.get("id") if isinstance(order, dict) else None
+        if oid is None:
+            continue
+        if not _is_ref(oid):
+            errors[i] = f"id inválido (se esperaba texto o número): {oid!r}"
+        elif oid in ids:
+            errors[i] = f"id duplicado: {oid}"
+        else:
+            ids[oid] = i
+
+    deps: list[dict[int, bool]] = []
+    last_of_domain: dict[str, int] = {}
+    last_of_canon: dict[str, int] = {}
+    for i, order in enumerate(orders):
+        d: dict[int, bool] = {}
+        if not isinstance(order, dict):
+            deps.append(d)
+            continue
+        domain, command = str(order.get("domain")), str(order.get("command"))
+        dom_spec = orders_spec.get(domain) if isinstance(orders_spec.get(domain), dict) else {}
+        cmd_spec = (dom_spec.get("commands") or {}).get(command) or {}
+
+        after = order.get("after")
+        refs = [after] if _is_ref(after) else after if isinstance(after, list) else []
+        if after is not None and not _is_ref(after) and not isinstance(after, list):
+            errors.setdefault(i, f"after inválido (se esperaba id o lista de ids): {after!r}")
+        for ref in refs:
+            if not _is_ref(ref):
+                errors.setdefault(i, f"dependencia inválida: {ref!r}")
+            elif ref in ids and ids[ref] != i:
+                d[ids[ref]] = True
+            else:
+                errors.setdefault(i, f"dependencia desconocida: {ref}")
+        for canon in cmd_spec.get("after") or []:
+            if canon in last_of_canon:
+                d[last_of_canon[canon]] = True
+        if dom_spec.get("serial", True) and domain in last_of_domain:
+            d.setdefault(last_of_domain[domain], False)
+
+        deps.append(d)
+        last_of_domain[domain] = i
+        last_of_canon[f"{domain}.{command}"] = i
+    return deps, errors
+
+def _fold_key(order, orders_spec: dict):
+    """Clave para juntar `order` con la anterior, o None si no se puede juntar."""
+    if not isinstance(order, dict) or order.get("id") is not None or order.get("after") is not None:
+        return None
+    domain, command = order.get("domain"), order.get("command")
+    dom_spec = orders_spec.get(domain) if isinstance(orders_spec.get(domain), dict) else {}
+    fold = ((dom_spec.get("commands") or {}).get(command) or {}).get("coalesce")
+    args = order.get("args") or {}
+    if not fold or not isinstance(args, dict):
+        return None
+    rest = {k: v for k, v in args.items() if k != fold}
+    try:
+        return json.dumps([domain, command, rest, order.get("timeout")], sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+
+def _fold_repeats(orders: list, orders_spec: dict):
+    """
+    Junta órdenes seguidas iguales cuyo comando declara "coalesce" en Orders.json:
+      - "coalesce": true    -> las repetidas se ejecutan una sola vez (p.ej. pause);
+      - "coalesce": "<arg>" -> una sola ejecución con <arg> = suma de los de cada
+        orden (por defecto 1): N "spotify next" seguidos -> un next con veces=N.
+    No se juntan órdenes con "id" o "after" propios.
+    Devuelve (órdenes, grupos): grupos[k] = índices originales que cubre la orden k.
+    """
+    folded, groups, keys = [], [], []
+    for i, order in enumerate(orders):
+        key = _fold_key(order, orders_spec)
+        fold = key and orders_spec[order["domain"]]["commands"][order["command"]]["coalesce"]
+        if isinstance(fold, str):
+            try:
+                count = int((order.get("args") or {}).get(fold) or 1)
+            except (TypeError, ValueError):
+                key = None
+        if key is not None and keys and keys[-1] == key:
+            if isinstance(fold, str):
+                prev = folded[-1]
+                prev["args"][fold] = int(prev["args"].get(fold) or 1) + count
+            groups[-1].append(i)
+            continue
+        if key is not None and isinstance(fold, str):
+            order = dict(order, args=dict(order.get("args") or {}))
+        folded.append(order)
+        groups.append([i])
+        keys.append(key)
+    return folded, groups
+
+async def _run_orders(orders: list, on_event=None) -> list:
+    """
+    Ejecuta las órdenes de un payload como un DAG (ver _build_dag):
+      - los nodos listos se ejecutan concurrentemente (máximo MAX_PARALLEL a la vez),
+      - si un nodo falla, se omiten los que dependen de su éxito.
+    Antes se juntan las repeticiones seguidas que lo admiten (ver _fold_repeats);
+    cada orden juntada recibe el resultado de la ejecución común.
+    Devuelve los resultados en los índices originales, cada uno con
+    "status": "ok" | "failed" | "skipped" (y su "id" si lo tenía).
+    """
+    try:
+        orders_spec = REGISTRY.load()
+    except Exception:
+        orders_spec = {}
+    total = len(orders)
+    orders, groups = _fold_repeats(orders, orders_spec)
+    n = len(orders)
+    deps, errors = _build_dag(orders, orders_spec)
+    children: list[list[tuple]] = [[] for _ in range(n)]
+    for i, d in enumerate(deps):
+        for j, hard in d.items():
+            children[j].append((i, hard))
+    remaining = [len(d) for d in deps]
+    blocked_by: list = [None] * n
+    results: list = [None] * n
+    ready = deque(i for i in range(n) if remaining[i] == 0)
+
+    def _finish(i: int, res: dict, status: str):
+        res["status"] = status
+        if isinstance(orders[i], dict) and orders[i].get("id") is not None:
+            res["id"] = orders[i]["id"]
+        results[i] = res
+        for c, hard in children[i]:
+            if hard and status != "ok" and blocked_by[c] is None:
+                blocked_by[c] = i
+            remaining[c] -= 1
+            if remaining[c] == 0:
+                ready.append(c)
+
+    sem = asyncio.Semaphore(max(1, MAX_PARALLEL))
+
+    async def _node(i: int) -> dict:
+        async with sem:
+            cb = (lambda evt: on_event(groups[i][0], evt)) if on_event else None
+            return await _run_one(orders[i], cb)
+
+    running: dict = {}
+    try:
+        while ready or running:
+            while ready:
+                i = ready.popleft()
+                if i in errors:
+                    _finish(i, {"ok": False, "error": errors[i]}, "failed")
+                elif blocked_by[i] is not None:
+                    _finish(i, {"ok": False, "error": f"Omitida: depende de la orden {blocked_by[i]}, que no se completó."}, "skipped")
+                else:
+                    running[asyncio.create_task(_node(i))] = i
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                i = running.pop(task)
+                res = task.result()
+                _finish(i, res, "ok" if res.get("ok") else "failed")
+    finally:
+        # cancelación del payload: cancela (y mata) lo que siga en marcha
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    # nodos que nunca quedaron listos -> ciclo de dependencias
+    for i in range(n):
+        if results[i] is None:
+            results[i] = {"ok": False, "error": "Dependencia circular.", "status": "skipped"}
+    unfolded: list = [None] * total
+    for i, group in enumerate(groups):
+        for k, j in enumerate(group):
+            unfolded[j] = results[i] if k == 0 else dict(results[i])
+    return unfolded
+
+async def run_payload_async(payload: str, on_event=None) -> dict:
+    """
+    Acepta:
+      - Una orden: {"domain":..., "command":..., "args":{...}}
+      - Varias: {"orders":[ {...}, {...} ]}
+    Devuelve JSON con el resultado (ok True/False).
+    on_event(indice_orden, evento) recibe el progreso que emitan las órdenes.
+    """
+    try:
+        data = json.loads(payload)
+    except Exception as e:
+        return {"ok": False, "error": f"JSON inválido: {e}", "raw": payload}
+
+    # Multi-órdenes
+    if isinstance(data, dict) and isinstance(data.get("orders"), list):
+        results = await _run_orders(data["orders"], on_event)
+        all_ok = all(bool(res.get("ok")) for res in results)
+        return {"ok": all_ok, "results": results}
+
+    # Orden única
+    if isinstance(data, dict):
+        cb = (lambda evt: on_event(0, evt)) if on_event else None
+        return await _run_one(data, cb)
+
+    return {"ok": False, "error": "Estructura no reconocida. Esperaba un objeto o {\"orders\":[...]}"}
+
+def run_payload(payload: str, on_event=None) -> dict:
+    """Envoltorio síncrono de run_payload_async (no usar dentro de un event loop)."""
+    return asyncio.run(run_payload_async(payload, on_event))
+
+if __name__ == "__main__":
+    # Si hay argumento, úsalo; si no, lee desde STDIN
+    payload = sys.argv[1] if len(sys.argv) >= 2 else sys.stdin.read()
+    out = run_payload(payload.strip())
+    print(json.dumps(out, ensure_ascii=False))
     sys.exit(0 if out.get("ok") else 1)
\ No newline at end of file
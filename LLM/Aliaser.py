@@ -1,107 +1,346 @@
-import json, re, os, uuid
-ALIAS_PATH =  "LLM/Alias.json"
-
-
-def _norm(text: str) -> str:
-    text = text.strip().lower()
-    return re.sub(r"\s+", " ", text)
-
-def ensure_rule_ids(db: dict) -> bool:
-    """Añade un id a cada regla que no lo tenga. Devuelve True si hubo cambios."""
-    changed = False
-    for canon, rules in db.items():
-        for r in rules:
-            if "id" not in r:
-                r["id"] = uuid.uuid4().hex
-                changed = True
-    if changed:
-        save_alias_db(db)
-    return changed
-
-def load_alias_db():
-    if not os.path.exists(ALIAS_PATH): return {}
-    with open(ALIAS_PATH, "r", encoding="utf-8") as f: return json.load(f)
-
-def save_alias_db(db): 
-    with open(ALIAS_PATH, "w", encoding="utf-8") as f: json.dump(db, f, ensure_ascii=False, indent=2)
-
-def alias_update(rule_id: str, new_pattern: str | None, new_args_map: dict | None, db: dict):
-    for canon, rules in db.items():
-        for r in rules:
-            if r.get("id") == rule_id:
-                if new_pattern is not None:
-                    r["pattern"] = new_pattern
-                if new_args_map is not None:
-                    r["args_map"] = new_args_map
-                save_alias_db(db)
-                return True, canon
-    return False, ""
-
-
-def try_alias(nl: str, alias_db: dict):
-    nl = _norm(nl)
-    best = None
-    for canon, rules in alias_db.items():  # canon = "domain.command"
-        for r in rules:
-            pat = _norm(r["pattern"]).replace("*", "(.*)")
-            m = re.fullmatch(pat, nl)
-            if not m:
-                continue
-            args = {}
-            for k, v in r.get("args_map", {}).items():
-                args[k] = v
-                for i, g in enumerate(m.groups(), 1):
-                    args[k] = args[k].replace(f"${i}", g.strip())
-            score = float(r.get("weight", 1.0))
-            if not best or score > best[0]:
-                dom, cmd = canon.split(".")
-                best = (
-                    score,
-                    {
-                        "domain": dom,
-                        "command": cmd,
-                        "args": args,
-                        "rule_id": r.get("id"),
-                        "canon": canon,
-                        "weight": score,
-                    },
-                )
-    return best[1] if best else None
-
-def learn_alias(nl: str, domain: str, command: str, args: dict, alias_db: dict):
-    key = f"{domain}.{command}"
-    alias_db.setdefault(key, [])
-    for r in alias_db[key]:
-        if r["pattern"] == nl:
-            r["weight"] = min(2.0, r.get("weight", 1.0) + 0.1)
-            save_alias_db(alias_db)
-            return
-    # nueva regla con id
-    alias_db[key].append({
-        "id": uuid.uuid4().hex,
-        "pattern": nl,
-        "args_map": args,
-        "weight": 0.5
-    })
-    save_alias_db(alias_db)
-
-def alias_adjust(rule_id: str, delta: float, db: dict, mode: str = "inc"):
-    changed = False
-    for canon, rules in db.items():
-        for r in rules:
-            if r.get("id") == rule_id:
-                w = float(r.get("weight", 1.0))
-                w = min(5.0, w + delta) if mode == "inc" else max(0.0, w - delta)
-                r["weight"] = w
-                save_alias_db(db)
-                return True, canon, w
-    return False, "", 0.0
-
-def alias_delete(rule_id: str, db: dict):
-    for canon, rules in list(db.items()):
-        new_rules = [r for r in rules if r.get("id") != rule_id]
-        if len(new_rules) != len(rules):
-            db[canon] = new_rules
-            save_alias_db(db)
-            return True, canon
-    return False, ""
\ No newline at end of file
+import json, re, os, uuid, bisect, heapq, threading, atexit
+ALIAS_PATH =  "LLM/Alias.json"
+# Diario append-only de mutaciones; se reaplica sobre el snapshot al cargar
+JOURNAL_PATH = "LLM/Alias.journal.jsonl"
+JOURNAL_DEBOUNCE_S = 0.5      # ventana para agrupar escrituras del diario
+JOURNAL_COMPACT_EVERY = 500   # líneas de diario antes de reescribir el snapshot
+
+# Primer token de un patrón que se puede usar como clave de cubeta: solo
+# caracteres de palabra, sin metacaracteres de regex ni comodines.
+_LITERAL_TOKEN = re.compile(r"\w+")
+
+
+def _norm(text: str) -> str:
+    text = text.strip().lower()
+    return re.sub(r"\s+", " ", text)
+
+
+class _AliasIndex:
+    """
+    Matcher compilado del Alias.json.
+    - Patrones normalizados y compilados una sola vez.
+    - Reglas agrupadas por su primer token literal ('' = empieza por comodín/regex).
+    - Cada cubeta ordenada por (-peso, posición) -> la primera que casa gana,
+      con el mismo desempate que el recorrido lineal original.
+    Mantiene además los índices rule_id -> (canon, regla) y
+    (canon, patrón) -> reglas para feedback, ediciones y deduplicado en O(1).
+    Se actualiza de forma incremental desde las funciones que mutan la BD.
+    """
+
+    def __init__(self, db: dict):
+        self.db = db
+        self.buckets: dict[str, list] = {}
+        self.entries: dict[int, list] = {}    # id(regla) -> entrada
+        self.canon_pos: dict[str, int] = {}   # canon -> orden en el dict
+        self.next_pos: dict[str, int] = {}    # canon -> siguiente posición de regla
+        self.by_id: dict[str, tuple] = {}     # rule_id -> (canon, regla)
+        self.by_pattern: dict[tuple, list] = {}  # (canon, patrón) -> [reglas en orden]
+        self.missing_ids: dict[int, dict] = {}   # id(regla) -> regla sin "id"
+        for canon, rules in db.items():
+            for r in rules:
+                self.add(canon, r)
+
+    @staticmethod
+    def _compile(pattern: str):
+        pat = _norm(pattern)
+        first = pat.split(" ", 1)[0]
+        bucket = first if _LITERAL_TOKEN.fullmatch(first) else ""
+        try:
+            rx = re.compile(pat.replace("*", "(.*)"))
+        except re.error:
+            rx = None  # patrón inválido: nunca casa
+        return bucket, rx
+
+    # --- cubetas ---
+    def _insert(self, entry: list):
+        bisect.insort(self.buckets.setdefault(entry[4], []), entry, key=lambda e: e[0])
+
+    def _discard(self, entry: list):
+        lst = self.buckets[entry[4]]
+        i = bisect.bisect_left(lst, entry[0], key=lambda e: e[0])
+        if i < len(lst) and lst[i] is entry:
+            del lst[i]
+        else:
+            lst.remove(entry)
+
+    # --- índice por patrón ---
+    def _link_pattern(self, canon: str, pattern: str, rule: dict):
+        # ordenadas por posición en la lista de `canon` (no por orden de enlace)
+        same = self.by_pattern.setdefault((canon, pattern), [])
+        bisect.insort(same, rule, key=lambda r: self.entries[id(r)][0][2])
+
+    def _unlink_pattern(self, canon: str, pattern: str, rule: dict):
+        same = self.by_pattern.get((canon, pattern), [])
+        for i, r in enumerate(same):
+            if r is rule:
+                del same[i]
+                break
+        if not same:
+            self.by_pattern.pop((canon, pattern), None)
+
+    # --- API ---
+    def add(self, canon: str, rule: dict):
+        if canon not in self.canon_pos:
+            self.canon_pos[canon] = len(self.canon_pos)
+            self.next_pos[canon] = 0
+        pos = self.next_pos[canon]
+        self.next_pos[canon] = pos + 1
+        bucket, rx = self._compile(rule["pattern"])
+        key = (-float(rule.get("weight", 1.0)), self.canon_pos[canon], pos)
+        entry = [key, canon, rule, rx, bucket]
+        self._insert(entry)
+        self.entries[id(rule)] = entry
+        if "id" in rule:
+            self.by_id[rule["id"]] = (canon, rule)
+        else:
+            self.missing_ids[id(rule)] = rule
+        self._link_pattern(canon, rule["pattern"], rule)
+
+    def remove(self, rule: dict):
+        entry = self.entries.pop(id(rule), None)
+        if entry is None:
+            return
+        self._discard(entry)
+        if self.by_id.get(rule.get("id"), (None, None))[1] is rule:
+            del self.by_id[rule["id"]]
+        self.missing_ids.pop(id(rule), None)
+        self._unlink_pattern(entry[1], rule["pattern"], rule)
+
+    def update(self, rule: dict, old_pattern: str | None = None):
+        """
+        Recalcula cubeta/regex/peso de una regla ya indexada (conserva su posición).
+        Si cambió el patrón, `old_pattern` es el anterior.
+        """
+        entry = self.entries.get(id(rule))
+        if entry is None:
+            return
+        self._discard(entry)
+        _, canon_pos, pos = entry[0]
+        entry[0] = (-float(rule.get("weight", 1.0)), canon_pos, pos)
+        if old_pattern is not None:
+            entry[4], entry[3] = self._compile(rule["pattern"])
+            self._unlink_pattern(entry[1], old_pattern, rule)
+            self._link_pattern(entry[1], rule["pattern"], rule)
+        self._insert(entry)
+
+    def set_id(self, rule: dict):
+        """Registra el id recién asignado a una regla que no lo tenía."""
+        entry = self.entries.get(id(rule))
+        self.missing_ids.pop(id(rule), None)
+        if entry is not None:
+            self.by_id[rule["id"]] = (entry[1], rule)
+
+    def find(self, rule_id: str):
+        """(canon, regla) para un rule_id, o (None, None)."""
+        return self.by_id.get(rule_id, (None, None))
+
+    def find_pattern(self, canon: str, pattern: str):
+        """Primera regla de `canon` con exactamente ese patrón, o None."""
+        same = self.by_pattern.get((canon, pattern))
+        return same[0] if same else None
+
+    def candidates(self, nl: str):
+        first = nl.split(" ", 1)[0]
+        literal = self.buckets.get(first, ()) if first else ()
+        return heapq.merge(literal, self.buckets.get("", ()), key=lambda e: e[0])
+
+
+_INDEX: _AliasIndex | None = None
+
+def _index_for(db: dict) -> _AliasIndex:
+    """Devuelve el índice de `db`, reconstruyéndolo si se cambió de BD."""
+    global _INDEX
+    if _INDEX is None or _INDEX.db is not db:
+        _INDEX = _AliasIndex(db)
+    return _INDEX
+
+def ensure_rule_ids(db: dict) -> bool:
+    """Añade un id a cada regla que no lo tenga. Devuelve True si hubo cambios."""
+    idx = _index_for(db)
+    if not idx.missing_ids:
+        return False
+    for r in list(idx.missing_ids.values()):
+        r["id"] = uuid.uuid4().hex
+        idx.set_id(r)
+    save_alias_db(db)
+    return True
+
+# ====== Persistencia: snapshot + diario ======
+_JOURNAL_LOCK = threading.Lock()
+_JOURNAL_PENDING: list[str] = []          # líneas aún no escritas
+_JOURNAL_TIMER: threading.Timer | None = None
+_JOURNAL_LINES = 0                        # líneas en disco desde el último snapshot
+
+
+def _apply_op(db: dict, op: dict):
+    """Aplica una operación del diario. Idempotente: 'put' reemplaza por id."""
+    canon = op.get("canon")
+    if not canon:
+        return
+    rules = db.setdefault(canon, [])
+    if op.get("op") == "put":
+        rule = op.get("rule") or {}
+        for i, r in enumerate(rules):
+            if r.get("id") == rule.get("id"):
+                rules[i] = rule
+                return
+        rules.append(rule)
+    elif op.get("op") == "del":
+        db[canon] = [r for r in rules if r.get("id") != op.get("id")]
+
+
+def load_alias_db():
+    global _JOURNAL_LINES
+    db = {}
+    if os.path.exists(ALIAS_PATH):
+        with open(ALIAS_PATH, "r", encoding="utf-8") as f: db = json.load(f)
+    if os.path.exists(JOURNAL_PATH):
+        n = 0
+        with open(JOURNAL_PATH, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    continue  # línea a medio escribir (corte durante el append)
+                _apply_op(db, op)
+                n += 1
+        _JOURNAL_LINES = n
+    return db
+
+def save_alias_db(db):
+    """Snapshot completo atómico (tmp + replace) y vacía el diario."""
+    global _JOURNAL_LINES
+    with _JOURNAL_LOCK:
+        _JOURNAL_PENDING.clear()
+        tmp = ALIAS_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(db, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, ALIAS_PATH)
+        if os.path.exists(JOURNAL_PATH):
+            os.remove(JOURNAL_PATH)
+        _JOURNAL_LINES = 0
+
+def flush_alias_journal():
+    """Escribe en disco las mutaciones pendientes del diario."""
+    global _JOURNAL_TIMER, _JOURNAL_LINES
+    with _JOURNAL_LOCK:
+        _JOURNAL_TIMER = None
+        if not _JOURNAL_PENDING:
+            return
+        with open(JOURNAL_PATH, "a+b") as f:
+            # si un corte dejó la última línea a medias, se cierra antes de
+            # añadir: pegado a ella, el registro nuevo se perdería al releer
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write("".join(_JOURNAL_PENDING).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        _JOURNAL_LINES += len(_JOURNAL_PENDING)
+        _JOURNAL_PENDING.clear()
+
+atexit.register(flush_alias_journal)
+
+def _journal(db: dict, op: dict):
+    """
+    Encola una mutación; se vuelca en segundo plano tras JOURNAL_DEBOUNCE_S.
+    Si el diario crece demasiado, compacta reescribiendo el snapshot.
+    """
+    global _JOURNAL_TIMER
+    with _JOURNAL_LOCK:
+        _JOURNAL_PENDING.append(json.dumps(op, ensure_ascii=False) + "\n")
+        compact = _JOURNAL_LINES + len(_JOURNAL_PENDING) >= JOURNAL_COMPACT_EVERY
+        if not compact and _JOURNAL_TIMER is None:
+            _JOURNAL_TIMER = threading.Timer(JOURNAL_DEBOUNCE_S, flush_alias_journal)
+            _JOURNAL_TIMER.daemon = True
+            _JOURNAL_TIMER.start()
+    if compact:
+        save_alias_db(db)
+
+def alias_update(rule_id: str, new_pattern: str | None, new_args_map: dict | None, db: dict):
+    idx = _index_for(db)
+    canon, r = idx.find(rule_id)
+    if r is None:
+        return False, ""
+    if new_pattern is not None:
+        old = r["pattern"]
+        r["pattern"] = new_pattern
+        idx.update(r, old_pattern=old)
+    if new_args_map is not None:
+        r["args_map"] = new_args_map
+    _journal(db, {"op": "put", "canon": canon, "rule": r})
+    return True, canon
+
+
+def try_alias(nl: str, alias_db: dict):
+    nl = _norm(nl)
+    for _, canon, r, rx, _ in _index_for(alias_db).candidates(nl):  # canon = "domain.command"
+        if rx is None:
+            continue
+        m = rx.fullmatch(nl)
+        if not m:
+            continue
+        args = {}
+        for k, v in r.get("args_map", {}).items():
+            args[k] = v
+            for i, g in enumerate(m.groups(), 1):
+                args[k] = args[k].replace(f"${i}", g.strip())
+        score = float(r.get("weight", 1.0))
+        dom, cmd = canon.split(".")
+        return {
+            "domain": dom,
+            "command": cmd,
+            "args": args,
+            "rule_id": r.get("id"),
+            "canon": canon,
+            "weight": score,
+        }
+    return None
+
+def learn_alias(nl: str, domain: str, command: str, args: dict, alias_db: dict):
+    """Crea (o refuerza si ya existe el patrón) un alias. Devuelve el id de la regla."""
+    idx = _index_for(alias_db)
+    key = f"{domain}.{command}"
+    alias_db.setdefault(key, [])
+    r = idx.find_pattern(key, nl)
+    if r is not None:
+        r["weight"] = min(2.0, r.get("weight", 1.0) + 0.1)
+        idx.update(r)
+        _journal(alias_db, {"op": "put", "canon": key, "rule": r})
+        return r.get("id")
+    # nueva regla con id
+    rule = {
+        "id": uuid.uuid4().hex,
+        "pattern": nl,
+        "args_map": args,
+        "weight": 0.5
+    }
+    alias_db[key].append(rule)
+    idx.add(key, rule)
+    _journal(alias_db, {"op": "put", "canon": key, "rule": rule})
+    return rule["id"]
+
+def alias_adjust(rule_id: str, delta: float, db: dict, mode: str = "inc"):
+    idx = _index_for(db)
+    canon, r = idx.find(rule_id)
+    if r is None:
+        return False, "", 0.0
+    w = float(r.get("weight", 1.0))
+    w = min(5.0, w + delta) if mode == "inc" else max(0.0, w - delta)
+    r["weight"] = w
+    idx.update(r)
+    _journal(db, {"op": "put", "canon": canon, "rule": r})
+    return True, canon, w
+
+def alias_delete(rule_id: str, db: dict):
+    idx = _index_for(db)
+    canon, r = idx.find(rule_id)
+    if r is None:
+        return False, ""
+    idx.remove(r)
+    db[canon] = [x for x in db[canon] if x is not r]
+    _journal(db, {"op": "del", "canon": canon, "id": rule_id})
+    return True, canon
@@ -1,6 +1,6 @@
-from __future__ import annotations
-import json
-import textwrap
-from typing import Any, Dict, Optional, Tuple
-
-import requests
+from __future__ import annotations
+import json
+import textwrap
+from typing import Any, Dict, Optional, Tuple
+
+import requests